@@ -8,9 +8,26 @@ This script runs BEFORE installing PyTorch to determine which version to install
 
 import subprocess
 import platform
+import re
+import shutil
 import sys
 import json
 import os
+import time
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+GPU_CONFIG_PATH = '.gpu_config.json'
+GPU_CONFIG_MAX_AGE = 24 * 60 * 60  # Reuse a previous detection for up to 1 day
+
+# `nvidia-smi -q` header line, e.g. "CUDA Version                          : 12.8"
+_CUDA_VERSION_RE = re.compile(r'CUDA Version\s*:\s*([\d.]+)')
+# `nvidia-smi -q` per-GPU line with the full, untruncated name,
+# e.g. "    Product Name                          : NVIDIA GeForce RTX 4090"
+_GPU_NAME_RE = re.compile(r'^\s*Product Name\s*:\s*(.+?)\s*$')
+# Leading major[.minor] of a CUDA version string
+_CUDA_MAJOR_MINOR_RE = re.compile(r'(\d+)(?:\.(\d+))?')
 
 # Fix Windows console encoding for Unicode
 if sys.platform == 'win32':
@@ -18,52 +35,72 @@ if sys.platform == 'win32':
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
+def read_cuda_toolkit_version(path='/usr/local/cuda/version.json'):
+    """
+    Read the installed CUDA toolkit version from its version.json manifest.
+    Returns: version string (e.g. "12.4.1") or None if unavailable
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)['cuda']['version']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+@functools.lru_cache(maxsize=1)
 def detect_nvidia_gpu():
     """
     Detect NVIDIA GPU using nvidia-smi.
     Returns: (has_gpu, gpu_name, cuda_version) or (False, None, None)
     """
+    # Skip the subprocess entirely on machines without the NVIDIA driver
+    if shutil.which('nvidia-smi') is None:
+        return False, None, None
+
     try:
-        # Try to run nvidia-smi
-        result = subprocess.run(
-            ['nvidia-smi', '--query-gpu=name,driver_version', '--format=csv,noheader'],
-            capture_output=True,
+        # A single `nvidia-smi -q` call reports both the CUDA version (in the
+        # header) and the full GPU name (in the first GPU section), the same on
+        # Linux and Windows. Stream its output and stop reading at the first name.
+        proc = subprocess.Popen(
+            ['nvidia-smi', '-q'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
             text=True,
-            timeout=5
+            errors='replace'  # A stray non-UTF-8 byte shouldn't hide the GPU
         )
+        watchdog = threading.Timer(5, proc.kill)
+        watchdog.start()
 
-        if result.returncode == 0 and result.stdout.strip():
-            lines = result.stdout.strip().split('\n')
-            gpu_name = lines[0].split(',')[0].strip()
-            driver_version = lines[0].split(',')[1].strip()
-
-            # Get CUDA version from nvidia-smi output
-            # Method 1: Try to get from nvidia-smi general output
-            cuda_version = None
-            try:
-                cuda_result = subprocess.run(
-                    ['nvidia-smi'],
-                    capture_output=True,
-                    text=True,
-                    timeout=5
-                )
-
-                if cuda_result.returncode == 0:
-                    # Parse CUDA version from output like "CUDA Version: 12.8"
-                    for line in cuda_result.stdout.split('\n'):
-                        if 'CUDA Version:' in line:
-                            cuda_version = line.split('CUDA Version:')[1].strip().split()[0]
-                            break
-            except:
-                pass
-
-            return True, gpu_name, cuda_version
-    except (FileNotFoundError, subprocess.TimeoutExpired, Exception):
+        gpu_name = None
+        cuda_version = None
+        try:
+            for line in proc.stdout:
+                if cuda_version is None:
+                    cuda_match = _CUDA_VERSION_RE.search(line)
+                    if cuda_match:
+                        cuda_version = cuda_match.group(1)
+                        continue
+
+                name_match = _GPU_NAME_RE.search(line)
+                if name_match:
+                    gpu_name = name_match.group(1)
+                    break
+        finally:
+            watchdog.cancel()
+            if proc.poll() is None:
+                proc.terminate()
+            proc.stdout.close()
+            proc.wait(timeout=5)
+
+        if gpu_name:
+            return True, gpu_name, cuda_version or read_cuda_toolkit_version()
+    except (OSError, ValueError, subprocess.TimeoutExpired):
         pass
 
     return False, None, None
 
 
+@functools.lru_cache(maxsize=1)
 def detect_amd_gpu():
     """
     Detect AMD GPU (ROCm support).
@@ -71,7 +108,7 @@ def detect_amd_gpu():
     """
     system = platform.system()
 
-    if system == "Linux":
+    if system == "Linux" and shutil.which('rocm-smi') is not None:
         try:
             # Try rocm-smi
             result = subprocess.run(
@@ -85,14 +122,15 @@ def detect_amd_gpu():
                 # Parse output
                 for line in result.stdout.split('\n'):
                     if 'GPU' in line and 'Card series' in line:
-                        gpu_name = line.split(':')[1].strip()
+                        gpu_name = line.split(':', 1)[-1].strip()
                         return True, gpu_name
-        except (FileNotFoundError, subprocess.TimeoutExpired, Exception):
+        except (OSError, ValueError, subprocess.TimeoutExpired):
             pass
 
     return False, None
 
 
+@functools.lru_cache(maxsize=1)
 def detect_apple_silicon():
     """
     Detect Apple Silicon (M1/M2/M3).
@@ -114,7 +152,7 @@ def detect_apple_silicon():
                 cpu_brand = result.stdout.strip()
                 if 'Apple' in cpu_brand:
                     return True, cpu_brand
-        except (FileNotFoundError, subprocess.TimeoutExpired, Exception):
+        except (OSError, ValueError, subprocess.TimeoutExpired):
             pass
 
     return False, None
@@ -133,43 +171,39 @@ def get_pytorch_install_command(gpu_info):
     if gpu_info['nvidia_gpu']:
         cuda_version = gpu_info['cuda_version']
 
-        # Determine CUDA version for PyTorch
-        if cuda_version:
-            try:
-                cuda_major = int(cuda_version.split('.')[0])
-                cuda_minor = int(cuda_version.split('.')[1]) if '.' in cuda_version else 0
-
-                # Support for CUDA 12.x (12.1 through 12.8+)
-                if cuda_major == 12:
-                    # Use cu121 for CUDA 12.1-12.4, cu124 for CUDA 12.4+
-                    if cuda_minor >= 4:
-                        torch_package = "torch torchvision torchaudio"
-                        index_url = "https://download.pytorch.org/whl/cu124"
-                        desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
-                    else:
-                        torch_package = "torch torchvision torchaudio"
-                        index_url = "https://download.pytorch.org/whl/cu121"
-                        desc = f"PyTorch with CUDA 12.1 support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
-
-                # Support for CUDA 11.x
-                elif cuda_major == 11:
-                    torch_package = "torch torchvision torchaudio"
-                    index_url = "https://download.pytorch.org/whl/cu118"
-                    desc = f"PyTorch with CUDA 11.8 support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
+        # Determine CUDA version for PyTorch. Only major/minor matter, so this
+        # also accepts "12", "12.8" and 4-component versions like "12.8.1.0"
+        version_match = _CUDA_MAJOR_MINOR_RE.match(cuda_version or '')
 
-                # For future CUDA versions (13+), try latest CUDA 12 build
-                else:
+        if version_match:
+            cuda_major = int(version_match.group(1))
+            cuda_minor = int(version_match.group(2) or 0)
+
+            # Support for CUDA 12.x (12.1 through 12.8+)
+            if cuda_major == 12:
+                # Use cu121 for CUDA 12.1-12.4, cu124 for CUDA 12.4+
+                if cuda_minor >= 4:
                     torch_package = "torch torchvision torchaudio"
                     index_url = "https://download.pytorch.org/whl/cu124"
-                    desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']} (detected CUDA {cuda_version})"
+                    desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
+                else:
+                    torch_package = "torch torchvision torchaudio"
+                    index_url = "https://download.pytorch.org/whl/cu121"
+                    desc = f"PyTorch with CUDA 12.1 support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
 
-            except (ValueError, IndexError):
-                # Fallback if version parsing fails
+            # Support for CUDA 11.x
+            elif cuda_major == 11:
+                torch_package = "torch torchvision torchaudio"
+                index_url = "https://download.pytorch.org/whl/cu118"
+                desc = f"PyTorch with CUDA 11.8 support for {gpu_info['gpu_name']} (CUDA {cuda_version})"
+
+            # For future CUDA versions (13+), try latest CUDA 12 build
+            else:
                 torch_package = "torch torchvision torchaudio"
                 index_url = "https://download.pytorch.org/whl/cu124"
-                desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']}"
+                desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']} (detected CUDA {cuda_version})"
         else:
-            # No CUDA version detected, use latest CUDA 12 build
+            # No usable CUDA version detected, use latest CUDA 12 build
             torch_package = "torch torchvision torchaudio"
             index_url = "https://download.pytorch.org/whl/cu124"
             desc = f"PyTorch with CUDA 12.4+ support for {gpu_info['gpu_name']}"
@@ -200,6 +234,26 @@ def get_pytorch_install_command(gpu_info):
         return pip_cmd, desc
 
 
+def load_cached_gpu_info(path=GPU_CONFIG_PATH, max_age=GPU_CONFIG_MAX_AGE):
+    """
+    Load GPU info from a previous run if the config file is recent enough.
+    Returns: gpu_info dict, or None if missing, stale, unreadable or out of
+    date with the installed NVIDIA driver
+    """
+    try:
+        if time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with open(path) as f:
+            gpu_info = json.load(f)['gpu_info']
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # A driver installed (or removed) since the last run means the result is stale
+    if (shutil.which('nvidia-smi') is not None) != bool(gpu_info.get('nvidia_gpu')):
+        return None
+    return gpu_info
+
+
 def main():
     """Main detection logic."""
     print("=" * 70)
@@ -207,21 +261,40 @@ def main():
     print("=" * 70)
     print()
 
-    # Detect all GPU types
-    nvidia_gpu, nvidia_name, cuda_version = detect_nvidia_gpu()
-    amd_gpu, amd_name = detect_amd_gpu()
-    apple_mps, apple_chip = detect_apple_silicon()
-
-    # Build GPU info dictionary
-    gpu_info = {
-        'nvidia_gpu': nvidia_gpu,
-        'gpu_name': nvidia_name,
-        'cuda_version': cuda_version,
-        'amd_gpu': amd_gpu,
-        'amd_name': amd_name,
-        'apple_silicon': apple_mps,
-        'chip_name': apple_chip
-    }
+    force = '--force' in sys.argv[1:]
+    gpu_info = None if force else load_cached_gpu_info()
+    # Only a fresh probe rewrites the config, so the cache's age keeps counting
+    probed = gpu_info is None
+
+    if not probed:
+        print(f"Using cached detection from {GPU_CONFIG_PATH} (run with --force to re-detect)")
+        print()
+    else:
+        # Detect all GPU types (probes overlap, so total wait is the slowest probe)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            nvidia_future = executor.submit(detect_nvidia_gpu)
+            amd_future = executor.submit(detect_amd_gpu)
+            apple_future = executor.submit(detect_apple_silicon)
+
+        nvidia_gpu, nvidia_name, cuda_version = nvidia_future.result()
+        amd_gpu, amd_name = amd_future.result()
+        apple_mps, apple_chip = apple_future.result()
+
+        # Build GPU info dictionary
+        gpu_info = {
+            'nvidia_gpu': nvidia_gpu,
+            'gpu_name': nvidia_name,
+            'cuda_version': cuda_version,
+            'amd_gpu': amd_gpu,
+            'amd_name': amd_name,
+            'apple_silicon': apple_mps,
+            'chip_name': apple_chip
+        }
+
+    nvidia_gpu, nvidia_name, cuda_version = (gpu_info['nvidia_gpu'], gpu_info['gpu_name'],
+                                             gpu_info['cuda_version'])
+    amd_gpu, amd_name = gpu_info['amd_gpu'], gpu_info['amd_name']
+    apple_mps, apple_chip = gpu_info['apple_silicon'], gpu_info['chip_name']
 
     # Display detection results
     print("Detection Results:")
@@ -271,11 +344,12 @@ def main():
         'description': description
     }
 
-    with open('.gpu_config.json', 'w') as f:
-        json.dump(config, f, indent=2)
+    if probed:
+        with open(GPU_CONFIG_PATH, 'w') as f:
+            json.dump(config, f, indent=2)
 
-    print("✅ Configuration saved to .gpu_config.json")
-    print()
+        print(f"✅ Configuration saved to {GPU_CONFIG_PATH}")
+        print()
 
     # Show expected speedup
     if nvidia_gpu or amd_gpu or apple_mps:
@@ -5,6 +5,9 @@ Test script to verify GPU setup is working correctly.
 """
 
 import sys
+import time
+import multiprocessing
+from queue import Empty
 
 # Fix Windows console encoding for Unicode
 if sys.platform == 'win32':
@@ -12,40 +15,99 @@ if sys.platform == 'win32':
     sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
     sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
 
+def _probe_pytorch_gpu(queue):
+    """
+    Probe PyTorch devices and report the findings through a queue.
+
+    Runs in a spawned child process so the CUDA context (and the VRAM it
+    holds) is released as soon as the probe finishes.
+    """
+    try:
+        import torch
+
+        info = {
+            'torch_version': torch.__version__,
+            'cuda_available': torch.cuda.is_available(),
+            'mps_available': hasattr(torch.backends, 'mps') and torch.backends.mps.is_available(),
+        }
+
+        if info['cuda_available']:
+            info['cuda_version'] = torch.version.cuda
+            info['device_count'] = torch.cuda.device_count()
+            info['device_name'] = torch.cuda.get_device_name(0)
+            info['device_capability'] = torch.cuda.get_device_capability(0)
+
+            # Test basic GPU operation
+            x = torch.randn(1000, 1000).cuda()
+            y = torch.randn(1000, 1000).cuda()
+            z = torch.matmul(x, y)
+            info['result_shape'] = tuple(z.shape)
+            info['memory_allocated_mb'] = torch.cuda.memory_allocated(0) / 1024**2
+        elif info['mps_available']:
+            x = torch.randn(1000, 1000).to('mps')
+            y = torch.randn(1000, 1000).to('mps')
+            z = torch.matmul(x, y)
+            info['result_shape'] = tuple(z.shape)
+
+        queue.put(info)
+    except Exception as e:
+        queue.put({'error': str(e)})
+
+
 def test_pytorch_gpu():
     """Test PyTorch GPU setup."""
     try:
-        import torch
+        ctx = multiprocessing.get_context('spawn')
+        queue = ctx.Queue()
+        probe = ctx.Process(target=_probe_pytorch_gpu, args=(queue,))
+        probe.start()
+
+        # Poll, so a probe that dies before reporting (e.g. a segfault in CUDA
+        # init or an OOM kill) is noticed right away instead of after the timeout
+        deadline = time.monotonic() + 300
+        info = None
+        while info is None:
+            try:
+                info = queue.get(timeout=1)
+            except Empty:
+                if not probe.is_alive():
+                    try:
+                        # Anything it put before exiting is already flushed
+                        info = queue.get(timeout=1)
+                    except Empty:
+                        probe.join()
+                        info = {'error': f'GPU probe died without a result (exit code {probe.exitcode})'}
+                elif time.monotonic() > deadline:
+                    probe.terminate()
+                    info = {'error': 'GPU probe did not finish within 300 seconds'}
+        probe.join()
+
+        if 'error' in info:
+            raise RuntimeError(info['error'])
+
         print("=" * 70)
         print("PyTorch GPU Test")
         print("=" * 70)
         print()
 
-        print(f"PyTorch Version: {torch.__version__}")
-        print(f"CUDA Available: {torch.cuda.is_available()}")
+        print(f"PyTorch Version: {info['torch_version']}")
+        print(f"CUDA Available: {info['cuda_available']}")
 
-        if torch.cuda.is_available():
-            print(f"CUDA Version (PyTorch): {torch.version.cuda}")
-            print(f"GPU Device Count: {torch.cuda.device_count()}")
-            print(f"Current GPU: {torch.cuda.get_device_name(0)}")
-            print(f"GPU Capability: {torch.cuda.get_device_capability(0)}")
+        if info['cuda_available']:
+            print(f"CUDA Version (PyTorch): {info['cuda_version']}")
+            print(f"GPU Device Count: {info['device_count']}")
+            print(f"Current GPU: {info['device_name']}")
+            print(f"GPU Capability: {info['device_capability']}")
 
-            # Test basic GPU operation
             print()
             print("Testing GPU computation...")
-            x = torch.randn(1000, 1000).cuda()
-            y = torch.randn(1000, 1000).cuda()
-            z = torch.matmul(x, y)
-            print(f"✅ GPU computation successful! Result shape: {z.shape}")
-            print(f"✅ GPU memory allocated: {torch.cuda.memory_allocated(0) / 1024**2:.2f} MB")
-        elif hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
+            print(f"✅ GPU computation successful! Result shape: {info['result_shape']}")
+            print(f"✅ GPU memory allocated: {info['memory_allocated_mb']:.2f} MB")
+        elif info['mps_available']:
             print("Apple Silicon (MPS) Available: Yes")
             print()
             print("Testing MPS computation...")
-            x = torch.randn(1000, 1000).to('mps')
-            y = torch.randn(1000, 1000).to('mps')
-            z = torch.matmul(x, y)
-            print(f"✅ MPS computation successful! Result shape: {z.shape}")
+            print(f"✅ MPS computation successful! Result shape: {info['result_shape']}")
         else:
             print("Running in CPU-only mode")
             print("⚠️  For better performance, ensure you have:")
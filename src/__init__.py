@@ -9,6 +9,7 @@ Modules:
     helpers: Data loading and general utility functions
     context_strategies: Template implementations for students to complete
     evaluation: LLM-based answer evaluation and scoring
+    embedders: Eager PyTorch and ONNX Runtime backends for the embedding model
     verify: Auto-grading system for lesson completion
 
 Author: [Your Name]
@@ -20,25 +21,42 @@ __version__ = "1.0.0"
 __author__ = "[Your Name]"
 __license__ = "Apache 2.0"
 
-# Import from modules that exist
+import importlib
+
+# Token management is lightweight (tiktoken and NumPy only), so import it eagerly
 from .token_manager import (
     count_tokens,
     fits_in_budget,
     TokenBudgetManager,
+    use_persistent_token_cache,
 )
 
-from .helpers import (
-    load_documents,
-    load_questions,
-    calculate_similarity,
-    format_context,
-)
+# helpers and evaluation pull in torch / transformers / sentence-transformers,
+# so their names are resolved on first access (PEP 562) to keep `import src` fast
+_LAZY_ATTRS = {
+    'load_documents': 'helpers',
+    'load_questions': 'helpers',
+    'calculate_similarity': 'helpers',
+    'format_context': 'helpers',
+    'evaluate_answer': 'evaluation',
+    'LLMEvaluator': 'evaluation',
+    'load_embedder': 'embedders',
+}
 
-# Import from evaluation module
-from .evaluation import (
-    evaluate_answer,
-    LLMEvaluator,
-)
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    module = importlib.import_module(f".{module_name}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value  # Cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS))
 
 # Define public API
 __all__ = [
@@ -46,6 +64,7 @@ __all__ = [
     'count_tokens',
     'fits_in_budget',
     'TokenBudgetManager',
+    'use_persistent_token_cache',
 
     # Data utilities
     'load_documents',
@@ -56,4 +75,7 @@ __all__ = [
     # Evaluation
     'evaluate_answer',
     'LLMEvaluator',
+
+    # Embedding backends
+    'load_embedder',
 ]
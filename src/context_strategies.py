@@ -8,11 +8,242 @@ NOTE: This file contains TEMPLATE code with TODOs. The completed versions
 should be in the lesson notebook, not here.
 """
 
-from typing import List, Dict, Optional
-from .token_manager import TokenBudgetManager, count_tokens
+import weakref
+from typing import List, Dict, Iterable, Optional, Tuple
+import torch
+import numpy as np
+from .token_manager import count_tokens, TokenBudgetManager
 from .helpers import format_context
 
 
+# Document embeddings per embedder, keyed by corpus hash. The same corpus is
+# ranked by every strategy for every question, so it only needs encoding once.
+# Entries are tied to the embedder by weak reference, so reloading the model in a
+# notebook drops the old tensors instead of letting a new object reuse its id().
+_DOC_EMB_CACHE: "weakref.WeakKeyDictionary[object, Dict[int, torch.Tensor]]" = weakref.WeakKeyDictionary()
+_DOC_EMB_CACHE_SIZE = 8
+
+# Query embeddings per embedder, shared by the ranking strategies when they are
+# evaluated one after another on the same question.
+_QUERY_EMB_CACHE: "weakref.WeakKeyDictionary[object, Dict[str, torch.Tensor]]" = weakref.WeakKeyDictionary()
+_QUERY_EMB_CACHE_SIZE = 1024
+
+
+def _embedder_cache(caches: weakref.WeakKeyDictionary, embedder) -> Dict:
+    """
+    Get the cache dict belonging to an embedder, creating it on first use.
+
+    Args:
+        caches: Module-level cache keyed weakly by embedder
+        embedder: SentenceTransformer model
+
+    Returns:
+        The embedder's own cache (a throwaway dict if it can't be weakly referenced)
+    """
+    try:
+        return caches.setdefault(embedder, {})
+    except TypeError:
+        return {}
+
+
+def _cache_put(cache: Dict, key, value, max_size: int):
+    """Store a value, evicting the oldest entry (dicts keep insertion order) when full."""
+    if len(cache) >= max_size:
+        del cache[next(iter(cache))]
+    cache[key] = value
+
+
+def _encode_documents(documents: List[Dict], embedder) -> torch.Tensor:
+    """
+    Encode document bodies, reusing a cached tensor for a previously seen corpus.
+
+    Args:
+        documents: List of document dicts
+        embedder: SentenceTransformer model
+
+    Returns:
+        Unit-normalized tensor of shape (len(documents), embedding_dim)
+    """
+    cache = _embedder_cache(_DOC_EMB_CACHE, embedder)
+    key = hash(tuple((doc.get('title', ''), doc['content']) for doc in documents))
+
+    doc_embs = cache.get(key)
+    if doc_embs is None:
+        contents = [doc['content'] for doc in documents]
+        doc_embs = embedder.encode(contents, convert_to_tensor=True,
+                                   batch_size=64, show_progress_bar=False,
+                                   normalize_embeddings=True)
+        _cache_put(cache, key, doc_embs, _DOC_EMB_CACHE_SIZE)
+
+    return doc_embs
+
+
+def _encode_query(query: str, embedder) -> torch.Tensor:
+    """
+    Encode a query, reusing the cached tensor if this embedder has seen it.
+
+    Args:
+        query: Question being asked
+        embedder: SentenceTransformer model
+
+    Returns:
+        Unit-normalized query embedding
+    """
+    cache = _embedder_cache(_QUERY_EMB_CACHE, embedder)
+
+    query_emb = cache.get(query)
+    if query_emb is None:
+        query_emb = embedder.encode(query, convert_to_tensor=True, normalize_embeddings=True)
+        _cache_put(cache, query, query_emb, _QUERY_EMB_CACHE_SIZE)
+
+    return query_emb
+
+
+@torch.inference_mode()
+def _rank_documents(documents: List[Dict],
+                    query: str,
+                    embedder,
+                    precision: str = 'float32') -> torch.Tensor:
+    """
+    Score every document against the query in a single batched pass.
+
+    All document bodies are encoded with one ``embedder.encode`` call so the
+    model sees full batches instead of one forward pass per document. Document
+    and query embeddings are cached for later calls, and everything runs under
+    inference mode since no gradients are ever needed.
+
+    Args:
+        documents: List of document dicts
+        query: Question being asked
+        embedder: SentenceTransformer model for ranking
+        precision: 'float32' for exact cosine scores, or 'int8' to score
+            int8-quantized embeddings (approximate, cheaper on large corpora)
+
+    Returns:
+        Tensor with the cosine similarity of each document to the query, in input order
+    """
+    if not documents:
+        return torch.empty(0)
+
+    doc_embs = _encode_documents(documents, embedder)
+    query_emb = _encode_query(query, embedder)
+
+    if precision == 'float32':
+        # Both sides are unit vectors, so one matrix-vector product gives all cosines
+        sims = doc_embs @ query_emb
+    elif precision == 'int8':
+        # Per-dimension grid calibrated on the corpus, as in sentence-transformers'
+        # quantize_embeddings. Dimensions where every document agrees get a dummy
+        # step of 1, so they quantize to the bottom of the grid without dividing by 0.
+        starts = doc_embs.min(dim=0).values
+        steps = (doc_embs.max(dim=0).values - starts) / 255
+        steps = torch.where(steps > 0, steps, torch.ones_like(steps))
+        doc_int8 = (torch.round((doc_embs - starts) / steps).clamp(0, 255) - 128).to(torch.int8)
+
+        # Only the documents are quantized: the query often falls outside the
+        # corpus range, so it is scored in float against the dequantized rows
+        sims = (doc_int8.to(steps.dtype) + 128) @ (steps * query_emb) + starts @ query_emb
+    else:
+        raise ValueError(f"Unknown ranking precision: {precision}")
+
+    # Left on the embedder's device; callers move only the final ordering to CPU
+    return sims
+
+
+def rank_once(documents: List[Dict],
+              query: str,
+              embedder,
+              precision: str = 'float32') -> List[Tuple[Dict, float]]:
+    """
+    Rank documents by relevance to the query, most relevant first.
+
+    Compute this once per query and pass it as ``ranked_docs`` to the primacy,
+    recency and sandwich strategies so they share a single ranking pass.
+
+    Args:
+        documents: List of document dicts
+        query: Question being asked
+        embedder: SentenceTransformer model for ranking
+        precision: Embedding precision used for ranking ('float32' or 'int8')
+
+    Returns:
+        List of (document, similarity) tuples sorted by similarity (highest first)
+    """
+    similarities = _rank_documents(documents, query, embedder, precision)
+    order = torch.argsort(similarities, descending=True, stable=True)
+    scores = similarities[order].float().cpu().tolist()
+    return [(documents[i], score) for i, score in zip(order.cpu().tolist(), scores)]
+
+
+def _ranked_documents(documents: List[Dict],
+                      query: str,
+                      embedder,
+                      precision: str,
+                      ranked_docs: Optional[List[Tuple[Dict, float]]],
+                      strategy: str) -> List[Dict]:
+    """
+    Return the documents in relevance order, reusing a precomputed ranking if given.
+
+    Args:
+        documents: List of document dicts
+        query: Question being asked
+        embedder: SentenceTransformer model for ranking
+        precision: Embedding precision used for ranking ('float32' or 'int8')
+        ranked_docs: Output of ``rank_once`` for this query, or None
+        strategy: Strategy name, used in the error message
+
+    Returns:
+        Documents sorted by similarity (highest first)
+    """
+    if ranked_docs is None:
+        if embedder is None:
+            raise ValueError(f"Embedder required for {strategy} strategy")
+        ranked_docs = rank_once(documents, query, embedder, precision)
+
+    return [doc for doc, _ in ranked_docs]
+
+
+def _format_documents(documents: List[Dict]) -> Tuple[List[str], List[int]]:
+    """
+    Format each document for the context and count its tokens, once.
+
+    Args:
+        documents: List of document dicts
+
+    Returns:
+        Tuple of (formatted document texts, token count of each text)
+    """
+    doc_texts = [f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
+                 for doc in documents]
+    token_counts = [count_tokens(text) for text in doc_texts]
+    return doc_texts, token_counts
+
+
+def _select_within_budget(order: Iterable[int],
+                          token_counts: List[int],
+                          token_limit: int,
+                          overhead: int = 50) -> List[int]:
+    """
+    Walk documents in the given order and keep them until the budget is full.
+
+    Args:
+        order: Document indices in the order they should be considered
+        token_counts: Pre-computed token count for each document
+        token_limit: Maximum tokens for context
+        overhead: Tokens reserved for the query
+
+    Returns:
+        Indices of the selected documents, in the given order
+    """
+    order = np.fromiter(order, dtype=np.int64)
+    counts = np.asarray(token_counts, dtype=np.int64)[order]
+
+    # One cumulative-sum pass instead of a Python loop over documents
+    fits = TokenBudgetManager(token_limit, overhead=overhead).pack(counts)
+
+    return order[fits].tolist()
+
+
 def naive_context_assembly(documents: List[Dict],
                            query: str,
                            token_limit: int = 4000) -> str:
@@ -30,25 +261,18 @@ def naive_context_assembly(documents: List[Dict],
     Returns:
         Assembled context string
     """
-    budget_manager = TokenBudgetManager(max_tokens=token_limit, overhead=50)
-    context_parts = []
-
-    for doc in documents:
-        doc_text = f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
+    doc_texts, token_counts = _format_documents(documents)
+    selected = _select_within_budget(range(len(documents)), token_counts, token_limit)
 
-        if budget_manager.can_add(doc_text):
-            budget_manager.add(doc_text)
-            context_parts.append(doc_text)
-        else:
-            break
-
-    return "\n\n---\n\n".join(context_parts)
+    return "\n\n---\n\n".join(doc_texts[i] for i in selected)
 
 
 def primacy_context_assembly(documents: List[Dict],
                              query: str,
                              token_limit: int = 4000,
-                             embedder=None) -> str:
+                             embedder=None,
+                             precision: str = 'float32',
+                             ranked_docs: Optional[List[Tuple[Dict, float]]] = None) -> str:
     """
     TEMPLATE: Primacy placement - most relevant documents at start.
 
@@ -59,46 +283,29 @@ def primacy_context_assembly(documents: List[Dict],
         query: Question being asked
         token_limit: Maximum tokens
         embedder: SentenceTransformer model for ranking
+        precision: Embedding precision used for ranking ('float32' or 'int8')
+        ranked_docs: Optional output of ``rank_once`` for this query; when given,
+            the documents are not re-ranked and ``embedder`` is not needed
 
     Returns:
         Assembled context string
     """
-    if embedder is None:
-        raise ValueError("Embedder required for primacy strategy")
-
-    # Rank documents by relevance
-    query_embedding = embedder.encode(query, convert_to_tensor=True)
-    ranked_docs = []
-
-    for doc in documents:
-        doc_embedding = embedder.encode(doc['content'], convert_to_tensor=True)
-        from .helpers import calculate_similarity
-        similarity = calculate_similarity(query_embedding, doc_embedding)
-        ranked_docs.append((doc, similarity.item()))
-
-    # Sort by similarity (highest first)
-    ranked_docs.sort(key=lambda x: x[1], reverse=True)
+    # Rank documents by relevance (highest first)
+    ranked = _ranked_documents(documents, query, embedder, precision, ranked_docs, 'primacy')
+    doc_texts, token_counts = _format_documents(ranked)
 
     # Assemble context with most relevant first
-    budget_manager = TokenBudgetManager(max_tokens=token_limit, overhead=50)
-    context_parts = []
-
-    for doc, score in ranked_docs:
-        doc_text = f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
-
-        if budget_manager.can_add(doc_text):
-            budget_manager.add(doc_text)
-            context_parts.append(doc_text)
-        else:
-            break
+    selected = _select_within_budget(range(len(ranked)), token_counts, token_limit)
 
-    return "\n\n---\n\n".join(context_parts)
+    return "\n\n---\n\n".join(doc_texts[i] for i in selected)
 
 
 def recency_context_assembly(documents: List[Dict],
                              query: str,
                              token_limit: int = 4000,
-                             embedder=None) -> str:
+                             embedder=None,
+                             precision: str = 'float32',
+                             ranked_docs: Optional[List[Tuple[Dict, float]]] = None) -> str:
     """
     TEMPLATE: Recency placement - most relevant documents at end.
 
@@ -109,46 +316,29 @@ def recency_context_assembly(documents: List[Dict],
         query: Question being asked
         token_limit: Maximum tokens
         embedder: SentenceTransformer model for ranking
+        precision: Embedding precision used for ranking ('float32' or 'int8')
+        ranked_docs: Optional output of ``rank_once`` for this query; when given,
+            the documents are not re-ranked and ``embedder`` is not needed
 
     Returns:
         Assembled context string
     """
-    if embedder is None:
-        raise ValueError("Embedder required for recency strategy")
-
-    # Rank documents by relevance
-    query_embedding = embedder.encode(query, convert_to_tensor=True)
-    ranked_docs = []
-
-    for doc in documents:
-        doc_embedding = embedder.encode(doc['content'], convert_to_tensor=True)
-        from .helpers import calculate_similarity
-        similarity = calculate_similarity(query_embedding, doc_embedding)
-        ranked_docs.append((doc, similarity.item()))
-
-    # Sort by similarity (lowest first, so highest end up at end)
-    ranked_docs.sort(key=lambda x: x[1], reverse=False)
+    # Rank documents by relevance (highest first)
+    ranked = _ranked_documents(documents, query, embedder, precision, ranked_docs, 'recency')
+    doc_texts, token_counts = _format_documents(ranked)
 
-    # Assemble context
-    budget_manager = TokenBudgetManager(max_tokens=token_limit, overhead=50)
-    context_parts = []
+    # Walk from lowest similarity up, so the highest end up at the end
+    selected = _select_within_budget(reversed(range(len(ranked))), token_counts, token_limit)
 
-    for doc, score in ranked_docs:
-        doc_text = f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
-
-        if budget_manager.can_add(doc_text):
-            budget_manager.add(doc_text)
-            context_parts.append(doc_text)
-        else:
-            break
-
-    return "\n\n---\n\n".join(context_parts)
+    return "\n\n---\n\n".join(doc_texts[i] for i in selected)
 
 
 def sandwich_context_assembly(documents: List[Dict],
                               query: str,
                               token_limit: int = 4000,
-                              embedder=None) -> str:
+                              embedder=None,
+                              precision: str = 'float32',
+                              ranked_docs: Optional[List[Tuple[Dict, float]]] = None) -> str:
     """
     TEMPLATE: Sandwich placement - relevant docs at both ends.
 
@@ -159,59 +349,26 @@ def sandwich_context_assembly(documents: List[Dict],
         query: Question being asked
         token_limit: Maximum tokens
         embedder: SentenceTransformer model for ranking
+        precision: Embedding precision used for ranking ('float32' or 'int8')
+        ranked_docs: Optional output of ``rank_once`` for this query; when given,
+            the documents are not re-ranked and ``embedder`` is not needed
 
     Returns:
         Assembled context string
     """
-    if embedder is None:
-        raise ValueError("Embedder required for sandwich strategy")
-
-    # Rank documents by relevance
-    query_embedding = embedder.encode(query, convert_to_tensor=True)
-    ranked_docs = []
+    # Rank documents by relevance (highest first)
+    ranked = _ranked_documents(documents, query, embedder, precision, ranked_docs, 'sandwich')
+    doc_texts, token_counts = _format_documents(ranked)
 
-    for doc in documents:
-        doc_embedding = embedder.encode(doc['content'], convert_to_tensor=True)
-        from .helpers import calculate_similarity
-        similarity = calculate_similarity(query_embedding, doc_embedding)
-        ranked_docs.append((doc, similarity.item()))
-
-    # Sort by similarity (highest first)
-    ranked_docs.sort(key=lambda x: x[1], reverse=True)
+    # Collect docs that fit
+    docs_to_include = _select_within_budget(range(len(ranked)), token_counts, token_limit)
 
-    # Determine how many docs to include
-    budget_manager = TokenBudgetManager(max_tokens=token_limit, overhead=50)
+    # Top quarter at the start, next quarter at the end, the rest in the middle.
+    # With fewer than 3 docs this degenerates to plain primacy order.
+    k = max(1, len(docs_to_include) // 4)
+    all_ordered = docs_to_include[:k] + docs_to_include[2 * k:] + docs_to_include[k:2 * k]
 
-    # Collect docs that fit
-    docs_to_include = []
-    for doc, score in ranked_docs:
-        doc_text = f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
-        if budget_manager.can_add(doc_text):
-            budget_manager.add(doc_text)
-            docs_to_include.append((doc, score))
-        else:
-            break
-
-    if len(docs_to_include) < 3:
-        # Too few docs, just use primacy
-        context_parts = [f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
-                        for doc, _ in docs_to_include]
-        return "\n\n---\n\n".join(context_parts)
-
-    # Split into three groups: high relevance at start, middle, high relevance at end
-    num_high_relevance = max(2, len(docs_to_include) // 3)
-
-    start_docs = docs_to_include[:num_high_relevance//2]
-    end_docs = docs_to_include[num_high_relevance//2:num_high_relevance]
-    middle_docs = docs_to_include[num_high_relevance:]
-
-    # Assemble: start + middle + end
-    all_ordered = start_docs + middle_docs + end_docs
-
-    context_parts = [f"Document: {doc.get('title', 'Untitled')}\n\n{doc['content']}"
-                    for doc, _ in all_ordered]
-
-    return "\n\n---\n\n".join(context_parts)
+    return "\n\n---\n\n".join(doc_texts[i] for i in all_ordered)
 
 
 # Placeholder for optimization strategies (students implement one)
@@ -0,0 +1,173 @@
+"""
+Embedders - Interchangeable backends for the sentence embedding model
+
+This module provides:
+- load_embedder: one entry point for the eager PyTorch and ONNX Runtime backends
+- OnnxEmbedder: an ONNX Runtime model exposing SentenceTransformer's encode API
+
+Every backend returns an object with a SentenceTransformer-compatible
+``encode``, so context_strategies and evaluation work unchanged with any of them.
+The ONNX backends need the optional ``optimum[onnxruntime]`` package
+(``optimum[onnxruntime-gpu]`` for CUDA).
+"""
+
+from pathlib import Path
+from typing import List, Optional, Union
+import torch
+from sentence_transformers import SentenceTransformer
+
+
+# Exported ONNX models are reused across sessions, since exporting takes a while
+ONNX_CACHE_DIR = Path.home() / ".cache" / "context-engineering-lesson" / "onnx"
+
+EMBEDDER_BACKENDS = ('torch', 'onnx', 'onnx-int8')
+
+
+class OnnxEmbedder:
+    """
+    ONNX Runtime sentence embedder with SentenceTransformer's encode API.
+
+    Embeddings are mean-pooled over the attention mask, which matches
+    sentence-transformers/all-MiniLM-L6-v2 and most other mean-pooling models.
+
+    Examples:
+        >>> embedder = load_embedder("sentence-transformers/all-MiniLM-L6-v2", backend="onnx")
+        >>> embs = embedder.encode(["first text", "second text"], convert_to_tensor=True)
+    """
+
+    def __init__(self, model, tokenizer, device: str = "cpu", max_length: int = 256):
+        """
+        Initialize the embedder.
+
+        Args:
+            model: Loaded ORTModelForFeatureExtraction
+            tokenizer: Tokenizer for the model
+            device: Device the ONNX session runs on (cuda/cpu)
+            max_length: Maximum tokens per text; longer texts are truncated
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.device = torch.device(device)
+        self.max_length = max_length
+
+    def encode(self,
+               sentences: Union[str, List[str]],
+               batch_size: int = 32,
+               show_progress_bar: Optional[bool] = None,
+               convert_to_numpy: bool = True,
+               convert_to_tensor: bool = False,
+               normalize_embeddings: bool = False,
+               **kwargs):
+        """
+        Embed one text or a list of texts.
+
+        Args:
+            sentences: Text or list of texts to embed
+            batch_size: Number of texts per forward pass
+            show_progress_bar: Whether to show progress bar
+            convert_to_numpy: Return a NumPy array (ignored if convert_to_tensor)
+            convert_to_tensor: Return a torch tensor on the session's device
+            normalize_embeddings: Scale embeddings to unit length
+            **kwargs: Other SentenceTransformer.encode options, accepted and ignored
+
+        Returns:
+            Embedding of each text, or a single embedding if given one text
+        """
+        from tqdm.auto import tqdm
+
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        chunks = []
+        batch_starts = range(0, len(sentences), batch_size)
+
+        for start in tqdm(batch_starts, desc="Batches", disable=not show_progress_bar):
+            inputs = self.tokenizer(sentences[start:start + batch_size], return_tensors="pt",
+                                    padding=True, truncation=True, max_length=self.max_length)
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+
+            with torch.inference_mode():
+                token_embs = self.model(**inputs).last_hidden_state
+
+            # Mean-pool over real tokens only
+            mask = inputs['attention_mask'].unsqueeze(-1).to(token_embs.dtype)
+            chunks.append((token_embs * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9))
+
+        embeddings = torch.cat(chunks) if chunks else torch.empty(0, device=self.device)
+        if normalize_embeddings and len(embeddings):
+            embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=1)
+
+        if single:
+            embeddings = embeddings[0]
+        if convert_to_tensor:
+            return embeddings
+        if convert_to_numpy:
+            return embeddings.cpu().numpy()
+        return list(embeddings)
+
+
+def load_embedder(model_name: str,
+                  backend: str = 'torch',
+                  device: Optional[str] = None,
+                  cache_dir: Union[str, Path] = ONNX_CACHE_DIR):
+    """
+    Load a sentence embedding model with the chosen backend.
+
+    Args:
+        model_name: Hugging Face model name
+        backend: 'torch' for eager SentenceTransformer, 'onnx' for ONNX Runtime
+            (CUDA if available), or 'onnx-int8' for a dynamically int8-quantized
+            ONNX model, which runs on CPU and suits evaluation boxes without a GPU
+        device: Device to use (cuda/cpu/mps), auto-detected if None
+        cache_dir: Where exported ONNX models are kept between sessions
+
+    Returns:
+        Embedder with a SentenceTransformer-compatible encode method
+    """
+    if backend == 'torch':
+        return SentenceTransformer(model_name, device=device)
+    if backend not in EMBEDDER_BACKENDS:
+        raise ValueError(f"Unknown embedder backend: {backend}")
+
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+    except ImportError as e:
+        raise ImportError(
+            "The ONNX embedder backends need optimum: "
+            "pip install 'optimum[onnxruntime]' (or 'optimum[onnxruntime-gpu]' for CUDA)"
+        ) from e
+    from transformers import AutoTokenizer
+
+    # ONNX Runtime runs on CUDA or CPU; anything else (e.g. mps) falls back to CPU
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    elif device != "cuda":
+        device = "cpu"
+
+    # Export once; later loads read the saved ONNX graph directly
+    export_dir = Path(cache_dir) / model_name.replace("/", "__")
+    if not (export_dir / "model.onnx").exists():
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(export_dir)
+
+    file_name = "model.onnx"
+    if backend == 'onnx-int8':
+        from optimum.onnxruntime import ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+        # Dynamic quantization needs no calibration data, but only runs on CPU
+        device = "cpu"
+        file_name = "model_quantized.onnx"
+        if not (export_dir / file_name).exists():
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(save_dir=export_dir,
+                               quantization_config=AutoQuantizationConfig.avx2(is_static=False))
+
+    provider = "CUDAExecutionProvider" if device == "cuda" else "CPUExecutionProvider"
+    model = ORTModelForFeatureExtraction.from_pretrained(export_dir, file_name=file_name,
+                                                         provider=provider)
+    tokenizer = AutoTokenizer.from_pretrained(export_dir)
+
+    print(f"✅ Embedder loaded with {backend} backend on device: {device}")
+    return OnnxEmbedder(model, tokenizer, device=device)
@@ -9,8 +9,8 @@ This module provides functionality to:
 """
 
 import torch
-from typing import Dict, List, Tuple, Optional
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from typing import Dict, List, Tuple, Optional, Union
+from transformers import AutoModelForCausalLM, AutoTokenizer, DynamicCache
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
@@ -22,29 +22,115 @@ class LLMEvaluator:
     Uses a local LLM to generate answers and evaluate them against ground truth.
     Implements the "LLM-as-a-judge" pattern for automatic grading.
 
+    Prompts are batched with left padding, so load the model with a fused
+    attention kernel to keep long, padded contexts cheap, e.g.
+    AutoModelForCausalLM.from_pretrained(name, attn_implementation="sdpa")
+    (or "flash_attention_2" when flash-attn is installed).
+
     Examples:
         >>> evaluator = LLMEvaluator(model, tokenizer)
         >>> answer = evaluator.generate_answer(context, question)
         >>> score = evaluator.score_answer(answer, ground_truth)
     """
 
+    # The judge prompt is split so the fixed instructions come first: they are
+    # identical for every call, so their KV cache can be computed once and reused
+    _JUDGE_PREFIX = """You are an expert evaluator. Compare the two answers below and rate how similar they are in meaning.
+
+Rate the similarity on a scale from 0 to 10, where:
+- 0 = Completely different or wrong
+- 5 = Partially correct, captures some key points
+- 10 = Essentially the same meaning, fully correct
+
+Provide ONLY a single number from 0-10 as your response.
+
+"""
+
+    _JUDGE_SUFFIX = """Reference Answer: {ground_truth}
+
+Generated Answer: {answer}
+
+Rating:"""
+
+    # The QA prompt is "header + context + mid + question + tail". The fixed
+    # pieces are tokenized once in __init__ and spliced around the variable ids.
+    _QA_HEADER = """Based on the following context, answer the question concisely and accurately.
+
+Context:
+"""
+
+    _QA_MID = """
+
+Question: """
+
+    _QA_TAIL = """
+
+Answer:"""
+
     def __init__(self,
                  model: AutoModelForCausalLM,
                  tokenizer: AutoTokenizer,
                  embedder: Optional[SentenceTransformer] = None,
-                 device: Optional[str] = None):
+                 device: Optional[str] = None,
+                 dtype: Optional[torch.dtype] = None,
+                 hybrid_low: float = 0.55,
+                 hybrid_high: float = 0.9,
+                 compile_model: bool = False):
         """
         Initialize the evaluator.
 
         Args:
             model: Loaded LLM for generation
             tokenizer: Tokenizer for the model
-            embedder: Optional embedding model for semantic similarity
+            embedder: Optional embedding model for semantic similarity. On GPU it
+                can be loaded in half precision too, e.g.
+                SentenceTransformer(name, model_kwargs={"torch_dtype": torch.bfloat16})
             device: Device to use (cuda/cpu/mps), auto-detected if None
+            dtype: Dtype to run the model in. If None, an fp32 model is cast to
+                torch.bfloat16 on CUDA GPUs that support it; otherwise the model is
+                left as loaded. The cast happens in place, so it changes the
+                caller's model object too.
+            hybrid_low: Hybrid scoring returns the semantic score as-is below this
+                value, without asking the LLM judge. Semantic scores are
+                (cosine + 1) / 2, and unrelated English text rarely scores below
+                cosine 0, so the default 0.55 means cosine < 0.1.
+            hybrid_high: Likewise above this value (0.9 means cosine > 0.8).
+                Use 0.0 and 1.0 to always judge.
+            compile_model: On CUDA, compile the model's forward pass with torch.compile
+                and warm it up with a few judge calls, falling back to eager mode if
+                the compiled scores differ. Saves per-call overhead on the many short
+                judge passes, at the cost of a slower first setup.
         """
         self.model = model
         self.tokenizer = tokenizer
         self.embedder = embedder
+        self.hybrid_low = hybrid_low
+        self.hybrid_high = hybrid_high
+
+        # Normalized ground-truth embeddings. References are the same for every
+        # strategy being compared, so each one only needs encoding once.
+        # Valid only for _truth_cache_embedder, and cleared if self.embedder changes.
+        self._truth_cache: Dict[str, torch.Tensor] = {}
+        self._truth_cache_embedder = embedder
+
+        # Batched decoder-only generation needs left padding so every prompt
+        # ends at the same column, and a pad token to pad with
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        # Token ids the judge's 0-10 rating is spelled with, so the rating can
+        # be read from a single forward pass instead of decoding text
+        self._judge_score_tokens = self._build_judge_score_tokens()
+        # KV cache of _JUDGE_PREFIX, built on first use of the judge
+        self._judge_prefix_kv = None
+
+        # Token ids of the fixed QA template pieces, plus whatever special
+        # tokens (e.g. BOS) the tokenizer puts at the start of every prompt
+        self._qa_special_ids = self.tokenizer("")['input_ids']
+        self._qa_header_ids, self._qa_mid_ids, self._qa_tail_ids = self.tokenizer(
+            [self._QA_HEADER, self._QA_MID, self._QA_TAIL], add_special_tokens=False
+        )['input_ids']
 
         if device is None:
             if torch.cuda.is_available():
@@ -56,7 +142,33 @@ class LLMEvaluator:
         else:
             self.device = device
 
-        print(f"✅ LLMEvaluator initialized on device: {self.device}")
+        # Generation is bandwidth-bound, so half precision roughly doubles
+        # throughput. bf16 keeps fp32's exponent range, so no autocast is needed.
+        # Models already loaded in half precision (e.g. fp16) are left alone.
+        if (dtype is None and self.device == "cuda" and self.model.dtype == torch.float32
+                and torch.cuda.is_bf16_supported()):
+            dtype = torch.bfloat16
+        if dtype is not None and self.model.dtype != dtype and not getattr(self.model, "is_quantized", False):
+            self.model = self.model.to(dtype=dtype)
+
+        # Judge calls repeat the same shapes, so a compiled forward pays off quickly.
+        # Only forward is wrapped, so generate() and model attributes keep working.
+        # mode="default" avoids CUDA graphs, whose output buffers are overwritten
+        # by the next call while the judge still holds the previous KV cache.
+        if compile_model and self.device == "cuda" and hasattr(torch, "compile"):
+            eager_forward = self.model.forward
+            expected = self._llm_judge_scores(["warmup"], ["warmup"])
+            self.model.forward = torch.compile(eager_forward, mode="default", dynamic=True)
+            # Warm up now so the first real call doesn't pay the compile cost, and
+            # check (twice, to catch reused buffers) that scores match eager mode
+            for _ in range(2):
+                scores = self._llm_judge_scores(["warmup"], ["warmup"])
+                if abs(scores[0] - expected[0]) > 0.05:
+                    print("⚠️  Compiled model disagrees with eager mode; using eager forward")
+                    self.model.forward = eager_forward
+                    break
+
+        print(f"✅ LLMEvaluator initialized on device: {self.device} ({self.model.dtype})")
 
     def generate_answer(self,
                        context: str,
@@ -77,31 +189,103 @@ class LLMEvaluator:
         Returns:
             Generated answer as string
         """
-        # Format prompt
-        prompt = self._format_qa_prompt(context, question)
-
-        # Tokenize
-        inputs = self.tokenizer(prompt, return_tensors="pt", truncation=True, max_length=4096)
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-
-        # Generate
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                temperature=temperature,
-                top_p=top_p,
-                do_sample=temperature > 0,
-                pad_token_id=self.tokenizer.eos_token_id
-            )
+        return self.generate_answers([context], [question],
+                                     max_new_tokens=max_new_tokens,
+                                     temperature=temperature,
+                                     top_p=top_p)[0]
+
+    def generate_answers(self,
+                         contexts: List[str],
+                         questions: List[str],
+                         max_new_tokens: int = 256,
+                         temperature: float = 0.7,
+                         top_p: float = 0.9,
+                         batch_size: int = 8,
+                         show_progress: bool = False) -> List[str]:
+        """
+        Generate answers for many questions, batching prompts through the model.
+
+        Args:
+            contexts: List of context strings
+            questions: List of questions
+            max_new_tokens: Maximum tokens in each response
+            temperature: Sampling temperature (0.0 = deterministic)
+            top_p: Nucleus sampling parameter
+            batch_size: Number of prompts per generate call
+            show_progress: Whether to show progress bar
 
-        # Decode only the new tokens
-        answer = self.tokenizer.decode(
-            outputs[0][inputs['input_ids'].shape[1]:],
-            skip_special_tokens=True
-        ).strip()
+        Returns:
+            Generated answers, in input order
+        """
+        prompts = self._qa_prompt_ids(contexts, questions, max_length=4096)
+
+        # Only pass sampling settings when sampling, so greedy runs skip the logits warpers
+        if temperature > 0:
+            sampling_kwargs = dict(do_sample=True, temperature=temperature, top_p=top_p)
+        else:
+            sampling_kwargs = dict(do_sample=False, num_beams=1)
+
+        return self._generate_batched(
+            prompts,
+            max_length=4096,
+            batch_size=batch_size,
+            show_progress=show_progress,
+            desc="Generating answers",
+            max_new_tokens=max_new_tokens,
+            **sampling_kwargs
+        )
+
+    def _generate_batched(self,
+                          prompts: Union[List[str], List[List[int]]],
+                          max_length: int,
+                          batch_size: int = 8,
+                          show_progress: bool = False,
+                          desc: str = "Generating",
+                          **generate_kwargs) -> List[str]:
+        """
+        Run prompts through model.generate in padded batches.
+
+        Args:
+            prompts: Prompt strings, or prompt token ids that already fit max_length
+            max_length: Maximum prompt length in tokens (applies to strings)
+            batch_size: Number of prompts per generate call
+            show_progress: Whether to show progress bar
+            desc: Progress bar label
+            **generate_kwargs: Extra arguments for model.generate
+
+        Returns:
+            Decoded new tokens for each prompt, in input order
+        """
+        from tqdm.auto import tqdm
+
+        responses = []
+        batch_starts = range(0, len(prompts), batch_size)
+
+        for start in tqdm(batch_starts, desc=desc, disable=not show_progress):
+            batch = prompts[start:start + batch_size]
+
+            # Tokenize, or just pad prompts that arrive as token ids
+            if isinstance(batch[0], str):
+                inputs = self.tokenizer(batch, return_tensors="pt", padding=True,
+                                        truncation=True, max_length=max_length)
+            else:
+                inputs = self.tokenizer.pad({'input_ids': batch}, return_tensors="pt")
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
 
-        return answer
+            # Generate
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    **generate_kwargs
+                )
+
+            # Decode only the new tokens (prompts are left-padded to one length)
+            new_tokens = outputs[:, inputs['input_ids'].shape[1]:]
+            decoded = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+            responses.extend(text.strip() for text in decoded)
+
+        return responses
 
     def score_answer(self,
                     generated_answer: str,
@@ -118,15 +302,47 @@ class LLMEvaluator:
         Returns:
             Score from 0.0 to 1.0
         """
+        return self.score_answers([generated_answer], [ground_truth], method=method)[0]
+
+    def score_answers(self,
+                      generated_answers: List[str],
+                      ground_truths: List[str],
+                      method: str = "hybrid",
+                      batch_size: int = 8,
+                      show_progress: bool = False) -> List[float]:
+        """
+        Score many generated answers against their ground truths.
+
+        Args:
+            generated_answers: Answers produced by the model
+            ground_truths: Correct/reference answers
+            method: Scoring method ("semantic", "llm_judge", "hybrid")
+            batch_size: Number of judge prompts per generate call
+            show_progress: Whether to show progress bar
+
+        Returns:
+            Scores from 0.0 to 1.0, in input order
+        """
         if method == "semantic":
-            return self._semantic_similarity_score(generated_answer, ground_truth)
+            return self._semantic_similarity_scores(generated_answers, ground_truths).tolist()
         elif method == "llm_judge":
-            return self._llm_judge_score(generated_answer, ground_truth)
+            return self._llm_judge_scores(generated_answers, ground_truths,
+                                          batch_size=batch_size, show_progress=show_progress)
         elif method == "hybrid":
-            # Combine both methods (average)
-            semantic_score = self._semantic_similarity_score(generated_answer, ground_truth)
-            llm_score = self._llm_judge_score(generated_answer, ground_truth)
-            return (semantic_score + llm_score) / 2
+            # Combine both methods (average), but only pay for the LLM judge in
+            # the uncertain middle band. Clearly wrong or clearly right answers
+            # keep their semantic score, which skips most judge calls at the cost
+            # of not letting the judge correct the embedder at the extremes.
+            scores = self._semantic_similarity_scores(generated_answers, ground_truths)
+            uncertain = np.flatnonzero((scores >= self.hybrid_low) & (scores <= self.hybrid_high))
+
+            if uncertain.size:
+                llm_scores = self._llm_judge_scores([generated_answers[i] for i in uncertain],
+                                                    [ground_truths[i] for i in uncertain],
+                                                    batch_size=batch_size, show_progress=show_progress)
+                scores[uncertain] = (scores[uncertain] + np.asarray(llm_scores)) / 2
+
+            return scores.tolist()
         else:
             raise ValueError(f"Unknown scoring method: {method}")
 
@@ -141,23 +357,60 @@ class LLMEvaluator:
         Returns:
             Similarity score 0.0-1.0
         """
+        return float(self._semantic_similarity_scores([answer], [ground_truth])[0])
+
+    @torch.inference_mode()
+    def _semantic_similarity_scores(self,
+                                    answers: List[str],
+                                    ground_truths: List[str]) -> np.ndarray:
+        """
+        Score many answers by semantic similarity with a single encode call.
+
+        Args:
+            answers: Generated answers
+            ground_truths: Reference answers
+
+        Returns:
+            Array of similarity scores 0.0-1.0, in input order
+        """
         if self.embedder is None:
             raise ValueError("Embedder required for semantic similarity scoring")
 
-        # Encode both answers (ensure CPU for SentenceTransformer compatibility)
-        answer_emb = self.embedder.encode(answer, convert_to_tensor=True).cpu()
-        truth_emb = self.embedder.encode(ground_truth, convert_to_tensor=True).cpu()
-
-        # Calculate cosine similarity
-        similarity = torch.nn.functional.cosine_similarity(
-            answer_emb.unsqueeze(0),
-            truth_emb.unsqueeze(0)
-        ).item()
+        if not answers:
+            return np.empty(0)
+
+        if self._truth_cache_embedder is not self.embedder:
+            self._truth_cache.clear()
+            self._truth_cache_embedder = self.embedder
+
+        # Encode answers together with any references not seen before;
+        # normalized embeddings turn each cosine into a row-wise dot product
+        num_answers = len(answers)
+        new_truths = [truth for truth in dict.fromkeys(ground_truths)
+                      if truth not in self._truth_cache]
+        embeddings = self.embedder.encode(
+            list(answers) + new_truths,
+            batch_size=64,
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # Upcast so a half-precision embedder doesn't lose accuracy in the reduction
+        embeddings = embeddings.float()
+
+        # Clone, since a row view would keep this call's whole batch alive
+        for truth, truth_emb in zip(new_truths, embeddings[num_answers:]):
+            self._truth_cache[truth] = truth_emb.clone()
+
+        answer_embs = embeddings[:num_answers]
+        truth_embs = torch.stack([self._truth_cache[truth] for truth in ground_truths])
+
+        similarities = (answer_embs * truth_embs).sum(dim=-1)
 
         # Normalize to 0-1 range (cosine similarity is -1 to 1)
-        score = (similarity + 1) / 2
+        scores = ((similarities + 1) / 2).clamp(0.0, 1.0)
 
-        return max(0.0, min(1.0, score))
+        return scores.cpu().numpy()
 
     def _llm_judge_score(self, answer: str, ground_truth: str) -> float:
         """
@@ -172,41 +425,197 @@ class LLMEvaluator:
         Returns:
             Score 0.0-1.0
         """
-        # Format judging prompt
-        judge_prompt = f"""You are an expert evaluator. Compare the following two answers and rate how similar they are in meaning.
+        return self._llm_judge_scores([answer], [ground_truth])[0]
 
-Reference Answer: {ground_truth}
+    def _llm_judge_scores(self,
+                          answers: List[str],
+                          ground_truths: List[str],
+                          batch_size: int = 8,
+                          show_progress: bool = False) -> List[float]:
+        """
+        Score many answers with the LLM judge, batching the judge prompts.
 
-Generated Answer: {answer}
+        Args:
+            answers: Generated answers
+            ground_truths: Reference answers
+            batch_size: Number of judge prompts per forward/generate call
+            show_progress: Whether to show progress bar
 
-Rate the similarity on a scale from 0 to 10, where:
-- 0 = Completely different or wrong
-- 5 = Partially correct, captures some key points
-- 10 = Essentially the same meaning, fully correct
+        Returns:
+            Scores 0.0-1.0, in input order
+        """
+        from tqdm.auto import tqdm
 
-Provide ONLY a single number from 0-10 as your response.
+        if self._judge_score_tokens is not None:
+            judge_suffixes = [self._JUDGE_SUFFIX.format(answer=answer, ground_truth=ground_truth)
+                              for answer, ground_truth in zip(answers, ground_truths)]
+            scores = []
+            batch_starts = range(0, len(judge_suffixes), batch_size)
+            for start in tqdm(batch_starts, desc="Judging answers", disable=not show_progress):
+                scores.extend(self._judge_logit_scores(judge_suffixes[start:start + batch_size]))
+            return scores
+
+        # Tokenizer spells ratings in a way we can't score from logits; decode instead
+        judge_prompts = [self._format_judge_prompt(answer, ground_truth)
+                         for answer, ground_truth in zip(answers, ground_truths)]
+        responses = self._generate_batched(
+            judge_prompts,
+            max_length=2048,
+            batch_size=batch_size,
+            show_progress=show_progress,
+            desc="Judging answers",
+            max_new_tokens=5,
+            do_sample=False,  # Plain greedy decoding for consistent scoring
+            num_beams=1
+        )
+
+        return [self._parse_judge_score(response) for response in responses]
+
+    def _build_judge_score_tokens(self) -> Optional[Tuple[List[int], List[int], Optional[int]]]:
+        """
+        Work out how the tokenizer spells a rating that follows "Rating:".
 
-Rating:"""
+        Returns:
+            Tuple of (lead_ids, digit_ids, ten_id), or None if the ratings can't
+            be read off the next-token logits. lead_ids are tokens that precede
+            every digit (e.g. a separate space token), digit_ids are the tokens
+            for 0-9, and ten_id is the single token for 10 or None when "10" is
+            spelled as "1" followed by "0".
+        """
+        def encode(text):
+            return self.tokenizer.encode(text, add_special_tokens=False)
+
+        spelled = [encode(f" {digit}") for digit in range(10)]
+        lead_ids = spelled[0][:-1]
+        if any(ids[:-1] != lead_ids for ids in spelled):
+            return None
+
+        digit_ids = [ids[-1] for ids in spelled]
+        if len(set(digit_ids)) != 10:
+            return None
+
+        ten = encode(" 10")
+        if ten == lead_ids + [digit_ids[1], digit_ids[0]]:
+            return lead_ids, digit_ids, None
+        if ten[:-1] == lead_ids and len(ten) == len(lead_ids) + 1 and ten[-1] not in digit_ids:
+            return lead_ids, digit_ids, ten[-1]
+        return None
+
+    def _get_judge_prefix_kv(self) -> Tuple:
+        """
+        Get the KV cache for the fixed judge instructions, computing it once.
 
-        # Generate score
-        inputs = self.tokenizer(judge_prompt, return_tensors="pt", truncation=True, max_length=2048)
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-
-        with torch.no_grad():
-            outputs = self.model.generate(
-                **inputs,
-                max_new_tokens=5,
-                temperature=0.1,  # Low temperature for consistent scoring
-                do_sample=False,
-                pad_token_id=self.tokenizer.eos_token_id
+        Returns:
+            Legacy (per-layer key, value) tuple for _JUDGE_PREFIX, batch size 1
+        """
+        if self._judge_prefix_kv is None:
+            prefix = self.tokenizer(self._JUDGE_PREFIX, return_tensors="pt")
+
+            with torch.inference_mode():
+                outputs = self.model(input_ids=prefix['input_ids'].to(self.device), use_cache=True)
+
+            past_key_values = outputs.past_key_values
+            if hasattr(past_key_values, "to_legacy_cache"):
+                past_key_values = past_key_values.to_legacy_cache()
+            # Own copies, so no later forward pass can write into the cached prefix
+            self._judge_prefix_kv = tuple(
+                (key.clone(), value.clone()) for key, value in past_key_values
             )
 
-        # Decode response
-        response = self.tokenizer.decode(
-            outputs[0][inputs['input_ids'].shape[1]:],
-            skip_special_tokens=True
-        ).strip()
+        return self._judge_prefix_kv
+
+    def _judge_logit_scores(self, judge_suffixes: List[str]) -> List[float]:
+        """
+        Score judge prompts from the rating token distribution.
+
+        One forward pass gives the probability of each rating 0-10 as the next
+        token; the score is the expected rating. This replaces decoding a few
+        tokens and parsing them with a regex. Only the per-pair suffix is run
+        through the model; the shared instructions come from the prefix cache.
+
+        Args:
+            judge_suffixes: Formatted per-pair judge prompt suffixes
+
+        Returns:
+            Scores 0.0-1.0, in input order
+        """
+        lead_ids, digit_ids, ten_id = self._judge_score_tokens
+        prefix_kv = self._get_judge_prefix_kv()
+        prefix_len = prefix_kv[0][0].shape[2]
+
+        inputs = self.tokenizer(judge_suffixes, return_tensors="pt", padding=True,
+                                truncation=True, max_length=2048 - prefix_len,
+                                add_special_tokens=False)
+        input_ids, suffix_mask = inputs['input_ids'], inputs['attention_mask']
+        batch_size = input_ids.shape[0]
+
+        if lead_ids:
+            lead = torch.tensor(lead_ids, dtype=input_ids.dtype).expand(batch_size, -1)
+            input_ids = torch.cat([input_ids, lead], dim=1)
+            suffix_mask = torch.cat([suffix_mask, torch.ones_like(lead)], dim=1)
+
+        input_ids = input_ids.to(self.device)
+        suffix_mask = suffix_mask.to(self.device)
+
+        # Layout is [prefix][left padding][suffix]: the mask covers the cached
+        # prefix too, and positions continue from the end of the prefix
+        attention_mask = torch.cat([
+            torch.ones(batch_size, prefix_len, dtype=suffix_mask.dtype, device=suffix_mask.device),
+            suffix_mask
+        ], dim=1)
+        position_ids = prefix_len + (suffix_mask.cumsum(dim=-1) - 1).clamp(min=0)
+
+        # Share the prefix cache across the batch (update() concatenates, so the
+        # stored tensors are never written to)
+        past_key_values = DynamicCache.from_legacy_cache(tuple(
+            (key.expand(batch_size, -1, -1, -1), value.expand(batch_size, -1, -1, -1))
+            for key, value in prefix_kv
+        ))
+
+        with torch.inference_mode():
+            outputs = self.model(input_ids=input_ids,
+                                 attention_mask=attention_mask,
+                                 position_ids=position_ids,
+                                 past_key_values=past_key_values,
+                                 use_cache=ten_id is None)
+            logits = outputs.logits[:, -1, :].float()
+            ratings = torch.arange(11, device=logits.device, dtype=torch.float32)
+
+            if ten_id is not None:
+                probs = logits[:, digit_ids + [ten_id]].softmax(dim=-1)
+            else:
+                # "10" starts like "1": one more step splits the mass on "1"
+                # into P(1) and P(10) using P("0" | "1")
+                probs = logits[:, digit_ids].softmax(dim=-1)
+                one_ids = torch.full((batch_size, 1), digit_ids[1],
+                                     dtype=input_ids.dtype, device=input_ids.device)
+                step_mask = torch.cat([attention_mask, torch.ones_like(one_ids)], dim=1)
+                step = self.model(input_ids=one_ids,
+                                  attention_mask=step_mask,
+                                  position_ids=prefix_len + suffix_mask.sum(dim=-1, keepdim=True),
+                                  past_key_values=outputs.past_key_values,
+                                  use_cache=False)
+                p_zero = step.logits[:, -1, :].float().softmax(dim=-1)[:, digit_ids[0]]
+                p_ten = probs[:, 1] * p_zero
+                probs = torch.cat([probs[:, :1],
+                                   (probs[:, 1] - p_ten).unsqueeze(1),
+                                   probs[:, 2:],
+                                   p_ten.unsqueeze(1)], dim=1)
+
+            expected = probs @ ratings
+
+        return (expected / 10.0).tolist()
+
+    def _parse_judge_score(self, response: str) -> float:
+        """
+        Extract the numeric rating from a judge response.
 
+        Args:
+            response: Decoded judge output
+
+        Returns:
+            Score 0.0-1.0 (0.5 if no rating could be parsed)
+        """
         # Extract numeric score
         try:
             # Try to parse first number found
@@ -224,6 +633,22 @@ Rating:"""
 
         return score
 
+    def _format_judge_prompt(self, answer: str, ground_truth: str) -> str:
+        """
+        Format the LLM-as-a-judge rating prompt.
+
+        Args:
+            answer: Generated answer
+            ground_truth: Reference answer
+
+        Returns:
+            Formatted prompt string
+        """
+        judge_prompt = self._JUDGE_PREFIX + self._JUDGE_SUFFIX.format(
+            answer=answer, ground_truth=ground_truth
+        )
+        return judge_prompt
+
     def _format_qa_prompt(self, context: str, question: str) -> str:
         """
         Format a question-answering prompt.
@@ -235,45 +660,72 @@ Rating:"""
         Returns:
             Formatted prompt string
         """
-        prompt = f"""Based on the following context, answer the question concisely and accurately.
+        prompt = f"{self._QA_HEADER}{context}{self._QA_MID}{question}{self._QA_TAIL}"
+        return prompt
 
-Context:
-{context}
+    def _qa_prompt_ids(self,
+                       contexts: List[str],
+                       questions: List[str],
+                       max_length: int) -> List[List[int]]:
+        """
+        Build QA prompt token ids from the pre-tokenized template pieces.
 
-Question: {question}
+        Only contexts and questions go through the tokenizer. When a prompt is
+        too long, the end of its context is sliced off, so the question and the
+        "Answer:" cue always survive (truncating the whole prompt would cut those).
+        Pieces are tokenized separately, so ids at the seams can differ slightly
+        from tokenizing _format_qa_prompt's string.
 
-Answer:"""
-        return prompt
+        Args:
+            contexts: List of context strings
+            questions: List of questions
+            max_length: Maximum prompt length in tokens
+
+        Returns:
+            Prompt token ids for each (context, question) pair, in input order
+        """
+        context_ids = self.tokenizer(contexts, add_special_tokens=False)['input_ids']
+        question_ids = self.tokenizer(questions, add_special_tokens=False)['input_ids']
+        fixed_length = (len(self._qa_special_ids) + len(self._qa_header_ids)
+                        + len(self._qa_mid_ids) + len(self._qa_tail_ids))
+
+        prompts = []
+        for ctx_ids, q_ids in zip(context_ids, question_ids):
+            ctx_budget = max(0, max_length - fixed_length - len(q_ids))
+            prompts.append(self._qa_special_ids + self._qa_header_ids + ctx_ids[:ctx_budget]
+                           + self._qa_mid_ids + q_ids + self._qa_tail_ids)
+
+        return prompts
 
     def evaluate_batch(self,
                       contexts: List[str],
                       questions: List[str],
                       ground_truths: List[str],
-                      show_progress: bool = True) -> List[Dict]:
+                      show_progress: bool = True,
+                      batch_size: int = 8) -> List[Dict]:
         """
         Evaluate a batch of questions.
 
+        Answers are generated for all questions first, then all of them are
+        scored, so both phases can run the model on full batches of prompts.
+
         Args:
             contexts: List of context strings
             questions: List of questions
             ground_truths: List of reference answers
             show_progress: Whether to show progress bar
+            batch_size: Number of prompts per generate call
 
         Returns:
             List of result dicts with 'answer', 'score', 'question' keys
         """
-        from tqdm.auto import tqdm
+        answers = self.generate_answers(contexts, questions,
+                                        batch_size=batch_size, show_progress=show_progress)
+        scores = self.score_answers(answers, ground_truths,
+                                    batch_size=batch_size, show_progress=show_progress)
 
         results = []
-        iterator = zip(contexts, questions, ground_truths)
-
-        if show_progress:
-            iterator = tqdm(list(iterator), desc="Evaluating")
-
-        for context, question, ground_truth in iterator:
-            answer = self.generate_answer(context, question)
-            score = self.score_answer(answer, ground_truth)
-
+        for question, answer, ground_truth, score in zip(questions, answers, ground_truths, scores):
             results.append({
                 'question': question,
                 'answer': answer,
@@ -284,6 +736,7 @@ Answer:"""
         return results
 
 
+@torch.inference_mode()
 def evaluate_answer(answer: str,
                    ground_truth: str,
                    embedder: SentenceTransformer) -> float:
@@ -300,8 +753,9 @@ def evaluate_answer(answer: str,
     Returns:
         Similarity score 0.0-1.0
     """
-    answer_emb = embedder.encode(answer, convert_to_tensor=True).cpu()
-    truth_emb = embedder.encode(ground_truth, convert_to_tensor=True).cpu()
+    # Encode both texts in one call and keep them on the embedder's device;
+    # .item() below is the only host sync
+    answer_emb, truth_emb = embedder.encode([answer, ground_truth], convert_to_tensor=True)
 
     similarity = torch.nn.functional.cosine_similarity(
         answer_emb.unsqueeze(0),
@@ -323,14 +777,15 @@ def calculate_metrics(results: List[Dict]) -> Dict[str, float]:
     Returns:
         Dictionary of metrics
     """
-    scores = [r['score'] for r in results]
+    # Build one contiguous array and compute every statistic on it
+    scores = np.fromiter((r['score'] for r in results), dtype=np.float64, count=len(results))
 
     metrics = {
-        'mean_score': np.mean(scores),
+        'mean_score': scores.mean(),
         'median_score': np.median(scores),
-        'std_score': np.std(scores),
-        'min_score': np.min(scores),
-        'max_score': np.max(scores),
+        'std_score': scores.std(),
+        'min_score': scores.min(),
+        'max_score': scores.max(),
         'num_evaluated': len(scores)
     }
 
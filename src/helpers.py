@@ -9,11 +9,76 @@ This module provides helper functions for:
 """
 
 import json
+import math
+import re
+from operator import itemgetter
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from types import MappingProxyType
+from typing import Iterator, List, Dict, Mapping, Tuple, Optional
 import torch
 import numpy as np
 
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the stdlib parser
+    orjson = None
+
+
+# Chunk boundaries for chunk_text
+_PARAGRAPH_RE = re.compile(r'\n\s*\n')
+_SENTENCE_RE = re.compile(r'[.!?]+\s+')
+
+# Above this many items, rank_by_field sorts numeric fields with NumPy
+_ARGSORT_MIN_ITEMS = 10_000
+
+
+def _read_json(filepath: Path):
+    """Parse a JSON file, using orjson on the raw bytes when available."""
+    if orjson is not None:
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # json.dump writes NaN/Infinity, which orjson rejects but json accepts
+            return json.loads(raw.decode('utf-8'))
+
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _has_non_finite(data) -> bool:
+    """Whether data contains a NaN or infinite float anywhere."""
+    if isinstance(data, (float, np.floating)):
+        return not math.isfinite(data)
+    if isinstance(data, dict):
+        return any(_has_non_finite(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_non_finite(value) for value in data)
+    if isinstance(data, np.ndarray) and np.issubdtype(data.dtype, np.floating):
+        return not np.isfinite(data).all()
+    return False
+
+
+def _write_json(data, filepath: Path):
+    """Write data as indented UTF-8 JSON, using orjson when available."""
+    # orjson writes NaN/Infinity as null; json keeps them, so they read back the same
+    if orjson is not None and not _has_non_finite(data):
+        try:
+            payload = orjson.dumps(data, option=orjson.OPT_INDENT_2
+                                   | orjson.OPT_NON_STR_KEYS
+                                   | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            payload = None  # Type orjson can't handle; let json try
+
+        if payload is not None:
+            with open(filepath, 'wb') as f:
+                f.write(payload)
+            return
+
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
 
 def load_documents(filepath: str) -> List[Dict]:
     """
@@ -34,8 +99,7 @@ def load_documents(filepath: str) -> List[Dict]:
     if not filepath.exists():
         raise FileNotFoundError(f"Document file not found: {filepath}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = _read_json(filepath)
 
     # Handle both formats: {'documents': [...]} and direct [...]
     if isinstance(data, dict) and 'documents' in data:
@@ -68,8 +132,7 @@ def load_questions(filepath: str) -> List[Dict]:
     if not filepath.exists():
         raise FileNotFoundError(f"Question file not found: {filepath}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    data = _read_json(filepath)
 
     # Handle both formats: {'questions': [...]} and direct [...]
     if isinstance(data, dict) and 'questions' in data:
@@ -83,6 +146,7 @@ def load_questions(filepath: str) -> List[Dict]:
     return questions
 
 
+@torch.inference_mode()
 def calculate_similarity(embedding1: torch.Tensor,
                         embedding2: torch.Tensor,
                         method: str = 'cosine') -> torch.Tensor:
@@ -97,9 +161,8 @@ def calculate_similarity(embedding1: torch.Tensor,
     Returns:
         Similarity score as tensor
     """
-    # Ensure both tensors are on the same device (CPU for compatibility)
-    embedding1 = embedding1.cpu()
-    embedding2 = embedding2.cpu()
+    # Compare on the first tensor's device; a no-op when both already match
+    embedding2 = embedding2.to(embedding1.device)
 
     if method == 'cosine':
         # Cosine similarity
@@ -157,7 +220,36 @@ def rank_by_field(items: List[Dict],
     Returns:
         Sorted list of items
     """
-    return sorted(items, key=lambda x: x.get(field, 0), reverse=not ascending)
+    if len(items) >= _ARGSORT_MIN_ITEMS:
+        raw = [item.get(field, 0) for item in items]
+        # Only plain ints/floats: NumPy would coerce numeric strings (and bools),
+        # ranking them differently from sorted()
+        if all(type(v) is int or type(v) is float for v in raw):
+            values = np.array(raw, dtype=np.float64)
+            # Stable sort on negated values keeps ties in input order, like sorted(reverse=True)
+            order = np.argsort(values if ascending else -values, kind='stable')
+            return [items[i] for i in order]
+
+    if all(field in item for item in items):
+        key = itemgetter(field)
+    else:
+        key = lambda x: x.get(field, 0)
+
+    return sorted(items, key=key, reverse=not ascending)
+
+
+def _split_on(pattern: re.Pattern, text: str) -> Iterator[str]:
+    """Yield the stripped, non-empty pieces of text between pattern matches."""
+    start = 0
+    for match in pattern.finditer(text):
+        piece = text[start:match.start()].strip()
+        if piece:
+            yield piece
+        start = match.end()
+
+    piece = text[start:].strip()
+    if piece:
+        yield piece
 
 
 def chunk_text(text: str,
@@ -175,14 +267,12 @@ def chunk_text(text: str,
         List of text chunks
     """
     if method == 'paragraph':
-        # Split on double newlines
-        chunks = [p.strip() for p in text.split('\n\n') if p.strip()]
+        # Split on blank lines
+        chunks = list(_split_on(_PARAGRAPH_RE, text))
 
     elif method == 'sentence':
         # Simple sentence splitting (could be enhanced with nltk)
-        import re
-        sentences = re.split(r'[.!?]+\s+', text)
-        chunks = [s.strip() for s in sentences if s.strip()]
+        chunks = list(_split_on(_SENTENCE_RE, text))
 
     elif method == 'fixed':
         # Fixed-size chunks
@@ -215,17 +305,27 @@ def calculate_coverage(selected_docs: List[Dict],
     return selected_tokens / total_tokens if total_tokens > 0 else 0
 
 
-def create_document_index(documents: List[Dict]) -> Dict[str, Dict]:
+def create_document_index(documents: List[Dict],
+                          assume_ids: bool = False,
+                          read_only: bool = False) -> Mapping[str, Dict]:
     """
     Create an index of documents by ID for quick lookup.
 
     Args:
         documents: List of document dicts with 'id' field
+        assume_ids: Skip the per-document 'id' check, e.g. after
+            validate_document_structure has passed
+        read_only: Return a read-only view so a cached index can be shared safely
 
     Returns:
         Dictionary mapping doc IDs to document dicts
     """
-    return {doc['id']: doc for doc in documents if 'id' in doc}
+    if assume_ids:
+        index = {doc['id']: doc for doc in documents}
+    else:
+        index = {doc['id']: doc for doc in documents if 'id' in doc}
+
+    return MappingProxyType(index) if read_only else index
 
 
 def validate_document_structure(documents: List[Dict]) -> Tuple[bool, List[str]]:
@@ -269,8 +369,7 @@ def save_results(results: Dict, filepath: str):
     filepath = Path(filepath)
     filepath.parent.mkdir(parents=True, exist_ok=True)
 
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(results, f, indent=2, ensure_ascii=False)
+    _write_json(results, filepath)
 
     print(f"✅ Results saved to {filepath}")
 
@@ -290,8 +389,7 @@ def load_results(filepath: str) -> Dict:
     if not filepath.exists():
         raise FileNotFoundError(f"Results file not found: {filepath}")
 
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return _read_json(filepath)
 
 
 # Example usage
@@ -1,21 +1,19 @@
 # Hint for naive_context_assembly implementation
+import numpy as np
 
 def naive_context_assembly(documents, query, token_limit=4000):
     """
     Naive context assembly: concatenate documents in order until token limit.
     """
-    context_parts = []
-    used_tokens = 0
     available_tokens = token_limit - 50  # Reserve for query
 
-    for doc in documents:
-        # Check if adding this document would exceed the limit
-        if used_tokens + doc['tokens'] > available_tokens:
-            break  # Stop if we'd exceed the limit
+    # Running token total after each document; every document whose running
+    # total is still within budget fits, so the cutoff is one binary search
+    cumulative_tokens = np.cumsum([doc['tokens'] for doc in documents])
+    num_fitting = int(np.searchsorted(cumulative_tokens, available_tokens, side='right'))
 
-        # Add document content with formatting
-        doc_text = f"Document: {doc['title']}\n{doc['content']}"
-        context_parts.append(doc_text)
-        used_tokens += doc['tokens']
+    # Add document content with formatting (only for docs that fit)
+    context_parts = [f"Document: {doc['title']}\n{doc['content']}"
+                     for doc in documents[:num_fitting]]
 
     return "\n\n".join(context_parts)
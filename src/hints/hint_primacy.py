@@ -1,27 +1,26 @@
 # Hint for primacy_context_assembly implementation
+import numpy as np
 
-def primacy_context_assembly(documents, query, token_limit=4000, embedder=None):
+def primacy_context_assembly(documents, query, token_limit=4000, embedder=None, ranked_docs=None):
     """
     Primacy placement: Most relevant documents at the START.
     """
-    if embedder is None:
-        # Fallback to naive if no embedder
-        return naive_context_assembly(documents, query, token_limit)
+    if ranked_docs is None:
+        if embedder is None:
+            # Fallback to naive if no embedder
+            return naive_context_assembly(documents, query, token_limit)
 
-    # Rank documents by relevance to query
-    ranked_docs = rank_documents_by_relevance(documents, query, embedder)
+        # Rank documents by relevance to query
+        # (pass ranked_docs in to reuse one ranking across strategies)
+        ranked_docs = rank_documents_by_relevance(documents, query, embedder)
 
-    # Assemble context with highest-ranked docs first
-    context_parts = []
-    used_tokens = 0
+    # Find how many of the highest-ranked docs fit in the budget
     available_tokens = token_limit - 50  # Reserve for query
+    cumulative_tokens = np.cumsum([doc['tokens'] for doc, score in ranked_docs])
+    num_fitting = int(np.searchsorted(cumulative_tokens, available_tokens, side='right'))
 
-    for doc, score in ranked_docs:
-        if used_tokens + doc['tokens'] > available_tokens:
-            break
-
-        doc_text = f"Document: {doc['title']}\n{doc['content']}"
-        context_parts.append(doc_text)
-        used_tokens += doc['tokens']
+    # Assemble context with highest-ranked docs first
+    context_parts = [f"Document: {doc['title']}\n{doc['content']}"
+                     for doc, score in ranked_docs[:num_fitting]]
 
     return "\n\n".join(context_parts)
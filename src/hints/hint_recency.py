@@ -1,31 +1,25 @@
 # Hint for recency_context_assembly implementation
+import numpy as np
 
-def recency_context_assembly(documents, query, token_limit=4000, embedder=None):
+def recency_context_assembly(documents, query, token_limit=4000, embedder=None, ranked_docs=None):
     """
     Recency placement: Most relevant documents at the END.
     """
-    if embedder is None:
-        return naive_context_assembly(documents, query, token_limit)
+    if ranked_docs is None:
+        if embedder is None:
+            return naive_context_assembly(documents, query, token_limit)
 
-    # Rank documents by relevance
-    ranked_docs = rank_documents_by_relevance(documents, query, embedder)
+        # Rank documents by relevance
+        ranked_docs = rank_documents_by_relevance(documents, query, embedder)
 
-    # Build context in reverse order, then reverse at the end
-    # This puts most relevant documents at the end
-    context_parts = []
-    used_tokens = 0
+    # Find how many of the most relevant docs fit in the budget
     available_tokens = token_limit - 50
+    cumulative_tokens = np.cumsum([doc['tokens'] for doc, score in ranked_docs])
+    num_fitting = int(np.searchsorted(cumulative_tokens, available_tokens, side='right'))
 
-    # Add documents starting from most relevant
-    for doc, score in ranked_docs:
-        if used_tokens + doc['tokens'] > available_tokens:
-            break
-
-        doc_text = f"Document: {doc['title']}\n{doc['content']}"
-        context_parts.append(doc_text)
-        used_tokens += doc['tokens']
-
-    # Reverse so most relevant is at the end
-    context_parts.reverse()
+    # Walk the fitting docs from least to most relevant,
+    # so the most relevant document ends up at the end
+    context_parts = [f"Document: {doc['title']}\n{doc['content']}"
+                     for doc, score in reversed(ranked_docs[:num_fitting])]
 
     return "\n\n".join(context_parts)
@@ -1,26 +1,22 @@
 # Hint for sandwich_context_assembly implementation
+import numpy as np
 
-def sandwich_context_assembly(documents, query, token_limit=4000, embedder=None):
+def sandwich_context_assembly(documents, query, token_limit=4000, embedder=None, ranked_docs=None):
     """
     Sandwich placement: Relevant docs at BOTH ends, less relevant in middle.
     """
-    if embedder is None:
-        return naive_context_assembly(documents, query, token_limit)
+    if ranked_docs is None:
+        if embedder is None:
+            return naive_context_assembly(documents, query, token_limit)
 
-    # Rank documents by relevance
-    ranked_docs = rank_documents_by_relevance(documents, query, embedder)
+        # Rank documents by relevance
+        ranked_docs = rank_documents_by_relevance(documents, query, embedder)
 
     # First, determine how many docs we can fit
     available_tokens = token_limit - 50
-    fitting_docs = []
-    used_tokens = 0
-
-    for doc, score in ranked_docs:
-        if used_tokens + doc['tokens'] <= available_tokens:
-            fitting_docs.append((doc, score))
-            used_tokens += doc['tokens']
-        else:
-            break
+    cumulative_tokens = np.cumsum([doc['tokens'] for doc, score in ranked_docs])
+    num_fitting = int(np.searchsorted(cumulative_tokens, available_tokens, side='right'))
+    fitting_docs = ranked_docs[:num_fitting]
 
     if len(fitting_docs) <= 2:
         # Not enough docs to sandwich, just use primacy
@@ -31,27 +27,12 @@ def sandwich_context_assembly(documents, query, token_limit=4000, embedder=None)
     # Split top 40% of docs between start and end
     sandwich_size = max(1, int(len(fitting_docs) * 0.4))
 
-    # Top docs for sandwich
-    top_docs = fitting_docs[:sandwich_size * 2]
-    # Remaining middle docs
-    middle_docs = fitting_docs[sandwich_size * 2:]
-
     # Assemble: first half of top docs + middle + second half of top docs
-    start_docs = top_docs[:sandwich_size]
-    end_docs = top_docs[sandwich_size:sandwich_size * 2]
-
-    context_parts = []
-
-    # Add start docs
-    for doc, score in start_docs:
-        context_parts.append(f"Document: {doc['title']}\n{doc['content']}")
-
-    # Add middle docs
-    for doc, score in middle_docs:
-        context_parts.append(f"Document: {doc['title']}\n{doc['content']}")
+    start_docs = fitting_docs[:sandwich_size]
+    end_docs = fitting_docs[sandwich_size:sandwich_size * 2]
+    middle_docs = fitting_docs[sandwich_size * 2:]
 
-    # Add end docs
-    for doc, score in end_docs:
-        context_parts.append(f"Document: {doc['title']}\n{doc['content']}")
+    context_parts = [f"Document: {doc['title']}\n{doc['content']}"
+                     for doc, score in start_docs + middle_docs + end_docs]
 
     return "\n\n".join(context_parts)
@@ -5,13 +5,37 @@ This module provides functions to count tokens accurately and manage token budge
 when assembling contexts for LLMs.
 """
 
+import functools
+import hashlib
+import math
+import os
+import sqlite3
+import threading
 import tiktoken
-from typing import List, Dict, Union
+import numpy as np
+from pathlib import Path
+from typing import Callable, List, Dict, Optional, Tuple, Union
 
 
-# Initialize tokenizer (cl100k_base is used by GPT-4, GPT-3.5, and is a good general-purpose encoder)
-_TOKENIZER = None
+# Token counts keyed by (encoding, content digest). Keying on a digest instead of
+# the text keeps large one-off strings (e.g. assembled contexts) from being held alive.
+_TOKEN_COUNT_CACHE: Dict[Tuple[str, bytes], int] = {}
+_TOKEN_COUNT_CACHE_SIZE = 4096
+# Serializes evictions; lookups are single dict reads and need no lock
+_TOKEN_COUNT_LOCK = threading.Lock()
 
+# Token-per-character multipliers for estimate_tokens_fast, relative to ~4 chars per token
+_TOKEN_FACTORS = {'code': 1.2, 'json': 1.15, 'markdown': 1.1, 'text': 0.95}
+
+# Default location of the opt-in on-disk cache (see use_persistent_token_cache)
+TOKEN_COUNT_CACHE_PATH = Path(__file__).parent.parent / "progress" / "token_counts.sqlite"
+
+# Set by use_persistent_token_cache(); None means in-memory caching only
+_PERSISTENT_CACHE: Optional["TokenCountCache"] = None
+
+
+# One tokenizer per encoding (cl100k_base is used by GPT-4, GPT-3.5, and is a good general-purpose encoder)
+@functools.lru_cache(maxsize=8)
 def get_tokenizer(model_name: str = "cl100k_base"):
     """
     Get or create tokenizer instance.
@@ -22,19 +46,182 @@ def get_tokenizer(model_name: str = "cl100k_base"):
     Returns:
         tiktoken.Encoding instance
     """
-    global _TOKENIZER
-    if _TOKENIZER is None:
-        _TOKENIZER = tiktoken.get_encoding(model_name)
-    return _TOKENIZER
+    return tiktoken.get_encoding(model_name)
+
+
+@functools.lru_cache(maxsize=8)
+def _max_token_bytes(model_name: str = "cl100k_base") -> int:
+    """Byte length of the longest token in an encoding's vocabulary."""
+    return max(map(len, get_tokenizer(model_name).token_byte_values()))
+
+
+def _greedy_fit(counts: np.ndarray, used: int, available: int) -> Tuple[np.ndarray, int]:
+    """
+    Walk counts in order, taking each one that still fits in the budget.
+
+    Args:
+        counts: Token count of each item
+        used: Tokens already used
+        available: Total tokens available
+
+    Returns:
+        Tuple of (mask of the items taken, tokens used afterwards)
+    """
+    taken = np.zeros(counts.shape[0], dtype=np.bool_)
+    for i in range(counts.shape[0]):
+        if used + counts[i] <= available:
+            used += counts[i]
+            taken[i] = True
+    return taken, used
+
+
+@functools.lru_cache(maxsize=1)
+def _greedy_fit_impl() -> Callable[[np.ndarray, int, int], Tuple[np.ndarray, int]]:
+    """
+    _greedy_fit compiled with Numba if it is installed, else the Python version.
+
+    Numba is imported on first use rather than with this module, since importing
+    it takes a while and only TokenBudgetManager.add_many needs it.
+    """
+    try:
+        from numba import njit
+    except ImportError:  # Optional speedup; add_many falls back to Python
+        return _greedy_fit
+    return njit(cache=True)(_greedy_fit)
+
+
+def _content_digest(text: str) -> bytes:
+    """Short, collision-resistant digest of text, used as a cache key."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class TokenCountCache:
+    """
+    Token counts persisted in SQLite, keyed by content digest and encoding.
+
+    Lets a fresh process reuse counts for a large corpus it has counted before.
+    The table is capped at max_rows; the oldest rows are dropped beyond that.
+
+    Examples:
+        >>> cache = TokenCountCache()
+        >>> cache.put_many([(digest, "cl100k_base", 42)])
+        >>> cache.get_many([digest], "cl100k_base")
+        {digest: 42}
+    """
+
+    def __init__(self, path: Union[str, Path] = TOKEN_COUNT_CACHE_PATH, max_rows: int = 100_000):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path: SQLite file to store counts in
+            max_rows: Maximum number of stored counts
+        """
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # One connection shared by every thread; _lock serializes its use
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        self._lock = threading.Lock()
+        # WAL lets readers and a writer in other processes work concurrently
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_counts ("
+                "hash BLOB NOT NULL, model TEXT NOT NULL, n INTEGER NOT NULL, "
+                "PRIMARY KEY (hash, model))"
+            )
+
+    def get_many(self, digests: List[bytes], model_name: str) -> Dict[bytes, int]:
+        """
+        Look up stored counts.
+
+        Args:
+            digests: Content digests to look up
+            model_name: Tokenizer encoding the counts were made with
+
+        Returns:
+            Dictionary mapping each found digest to its token count
+        """
+        found: Dict[bytes, int] = {}
+        with self._lock:
+            # Stay well under SQLite's limit on query parameters
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT hash, n FROM token_counts WHERE model = ? AND hash IN ({placeholders})",
+                    [model_name, *chunk]
+                )
+                found.update(rows)
+        return found
+
+    def put_many(self, entries: List[Tuple[bytes, str, int]]):
+        """
+        Store counts in one transaction, dropping the oldest rows over max_rows.
+
+        Args:
+            entries: (digest, model_name, token count) tuples
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO token_counts (hash, model, n) VALUES (?, ?, ?)", entries
+            )
+            # REPLACE gives rewritten rows a new rowid, so low rowids are the oldest
+            (num_rows,) = self._conn.execute("SELECT COUNT(*) FROM token_counts").fetchone()
+            if num_rows > self.max_rows:
+                self._conn.execute(
+                    "DELETE FROM token_counts WHERE rowid IN "
+                    "(SELECT rowid FROM token_counts ORDER BY rowid LIMIT ?)",
+                    (num_rows - self.max_rows,)
+                )
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def use_persistent_token_cache(path: Optional[Union[str, Path]] = TOKEN_COUNT_CACHE_PATH):
+    """
+    Back count_tokens_batch with an on-disk TokenCountCache.
 
+    Off by default. Only count_tokens_batch, used for document counts, reads and
+    writes it; count_tokens stays in memory, since the one-off strings it sees
+    (e.g. assembled contexts) would only grow the database.
 
-def count_tokens(text: str, model_name: str = "cl100k_base") -> int:
+    Args:
+        path: SQLite file to use, or None to go back to in-memory caching only
+    """
+    global _PERSISTENT_CACHE
+    if _PERSISTENT_CACHE is not None:
+        _PERSISTENT_CACHE.close()
+    _PERSISTENT_CACHE = TokenCountCache(path) if path is not None else None
+
+
+def _remember_count(key: Tuple[str, bytes], count: int):
+    """Store a count in the in-memory cache, evicting the oldest entry when full."""
+    with _TOKEN_COUNT_LOCK:
+        if len(_TOKEN_COUNT_CACHE) >= _TOKEN_COUNT_CACHE_SIZE:
+            # Dicts keep insertion order, so the first key is the oldest
+            del _TOKEN_COUNT_CACHE[next(iter(_TOKEN_COUNT_CACHE))]
+        _TOKEN_COUNT_CACHE[key] = count
+
+
+def count_tokens(text: str, model_name: str = "cl100k_base", *,
+                 tokenizer: Optional[tiktoken.Encoding] = None) -> int:
     """
     Count the number of tokens in a text string.
 
+    Results are cached in memory by content digest, since the same documents
+    are counted again by every strategy.
+
     Args:
         text: The text to tokenize
         model_name: Tokenizer encoding to use
+        tokenizer: Encoding for model_name if already resolved, used on a cache miss
 
     Returns:
         Number of tokens as integer
@@ -48,12 +235,74 @@ def count_tokens(text: str, model_name: str = "cl100k_base") -> int:
     if not text:
         return 0
 
-    tokenizer = get_tokenizer(model_name)
-    tokens = tokenizer.encode(text)
-    return len(tokens)
+    key = (model_name, _content_digest(text))
+    count = _TOKEN_COUNT_CACHE.get(key)
+    if count is not None:
+        return count
+
+    if tokenizer is None:
+        tokenizer = get_tokenizer(model_name)
+    count = len(tokenizer.encode(text))
+
+    _remember_count(key, count)
+    return count
+
+
+def count_tokens_batch(texts: List[str],
+                       model_name: str = "cl100k_base",
+                       num_workers: Optional[int] = None) -> List[int]:
+    """
+    Count tokens for many texts at once.
+
+    Cached texts are looked up as in count_tokens, then in the on-disk cache if
+    use_persistent_token_cache() was called; the rest are encoded in one tiktoken
+    encode_batch call. tiktoken releases the GIL while encoding, so its worker
+    threads run the BPE merges in parallel on all cores.
+
+    Args:
+        texts: The texts to tokenize
+        model_name: Tokenizer encoding to use
+        num_workers: Encoding threads, defaults to the number of CPUs
+
+    Returns:
+        Number of tokens for each text, in input order
+    """
+    # Empty texts have 0 tokens and are never looked up
+    digests = {i: _content_digest(text) for i, text in enumerate(texts) if text}
+    counts = [0] * len(texts)
+    missing: List[int] = []
+    for i, digest in digests.items():
+        count = _TOKEN_COUNT_CACHE.get((model_name, digest))
+        if count is None:
+            missing.append(i)
+        else:
+            counts[i] = count
+
+    if missing and _PERSISTENT_CACHE is not None:
+        stored = _PERSISTENT_CACHE.get_many([digests[i] for i in missing], model_name)
+        for i in missing:
+            if digests[i] in stored:
+                counts[i] = stored[digests[i]]
+                _remember_count((model_name, digests[i]), counts[i])
+        missing = [i for i in missing if digests[i] not in stored]
+
+    if missing:
+        tokenizer = get_tokenizer(model_name)
+        encoded = tokenizer.encode_batch([texts[i] for i in missing],
+                                         num_threads=num_workers or os.cpu_count() or 8)
+
+        for i, tokens in zip(missing, encoded):
+            counts[i] = len(tokens)
+            _remember_count((model_name, digests[i]), counts[i])
+
+        if _PERSISTENT_CACHE is not None:
+            _PERSISTENT_CACHE.put_many([(digests[i], model_name, counts[i]) for i in missing])
 
+    return counts
 
-def fits_in_budget(text: str, budget: int, model_name: str = "cl100k_base") -> bool:
+
+def fits_in_budget(text: str, budget: int, model_name: str = "cl100k_base", *,
+                   tokenizer: Optional[tiktoken.Encoding] = None) -> bool:
     """
     Check if text fits within a token budget.
 
@@ -61,6 +310,7 @@ def fits_in_budget(text: str, budget: int, model_name: str = "cl100k_base") -> b
         text: The text to check
         budget: Maximum number of tokens allowed
         model_name: Tokenizer encoding to use
+        tokenizer: Encoding for model_name if already resolved
 
     Returns:
         True if text fits, False otherwise
@@ -71,7 +321,15 @@ def fits_in_budget(text: str, budget: int, model_name: str = "cl100k_base") -> b
         >>> fits_in_budget("Very long text..." * 1000, 100)
         False
     """
-    return count_tokens(text, model_name) <= budget
+    # Every token covers at least one byte and at most the encoding's longest
+    # token, so the byte length alone settles most checks without running BPE
+    num_bytes = len(text.encode('utf-8'))
+    if num_bytes <= budget:
+        return True
+    if num_bytes > budget * _max_token_bytes(model_name):
+        return False
+
+    return count_tokens(text, model_name, tokenizer=tokenizer) <= budget
 
 
 def truncate_to_budget(text: str, budget: int, model_name: str = "cl100k_base",
@@ -92,18 +350,28 @@ def truncate_to_budget(text: str, budget: int, model_name: str = "cl100k_base",
         >>> truncate_to_budget("This is a long sentence that needs truncation", 5)
         "This is a long sentence"
     """
-    if fits_in_budget(text, budget, model_name):
-        return text
-
+    # Encode once and decide from the token list, rather than counting first
+    # and encoding again on overflow
     tokenizer = get_tokenizer(model_name)
     tokens = tokenizer.encode(text)
 
-    if from_end:
-        truncated_tokens = tokens[:budget]
+    if len(tokens) <= budget:
+        return text
+
+    cut = budget if from_end else len(tokens) - budget
+    kept, dropped = (tokens[:cut], tokens[cut:]) if from_end else (tokens[cut:], tokens[:cut])
+
+    if not text.isascii():
+        return tokenizer.decode(kept)
+
+    # For ASCII text one byte is one character, so the cut point can be found by
+    # decoding whichever side is shorter and slicing the original string
+    if len(kept) <= len(dropped):
+        kept_chars = len(tokenizer.decode_bytes(kept))
     else:
-        truncated_tokens = tokens[-budget:]
+        kept_chars = len(text) - len(tokenizer.decode_bytes(dropped))
 
-    return tokenizer.decode(truncated_tokens)
+    return text[:kept_chars] if from_end else text[len(text) - kept_chars:]
 
 
 class TokenBudgetManager:
@@ -122,6 +390,15 @@ class TokenBudgetManager:
         3200
     """
 
+    # Every field is annotated, so the class can be compiled (e.g. with mypyc) as-is
+    max_tokens: int
+    overhead: int
+    model_name: str
+    _tokenizer: tiktoken.Encoding
+    used_tokens: int
+    available_tokens: int
+    remaining: int
+
     def __init__(self, max_tokens: int, overhead: int = 300, model_name: str = "cl100k_base"):
         """
         Initialize token budget manager.
@@ -134,13 +411,14 @@ class TokenBudgetManager:
         self.max_tokens = max_tokens
         self.overhead = overhead
         self.model_name = model_name
+        # Resolve the encoding up front: a bad model_name fails here rather than
+        # on the first add_text, and string calls reuse it without a lookup
+        self._tokenizer = get_tokenizer(model_name)
         self.used_tokens = 0
         self.available_tokens = max_tokens - overhead
-
-    @property
-    def remaining(self) -> int:
-        """Get remaining token budget."""
-        return self.available_tokens - self.used_tokens
+        # Remaining token budget. A plain attribute kept in step with used_tokens,
+        # since packing loops read it for every candidate.
+        self.remaining = self.available_tokens
 
     @property
     def utilization(self) -> float:
@@ -158,14 +436,16 @@ class TokenBudgetManager:
             True if addition fits, False otherwise
         """
         if isinstance(tokens, str):
-            tokens = count_tokens(tokens, self.model_name)
+            return fits_in_budget(tokens, self.remaining, self.model_name, tokenizer=self._tokenizer)
 
-        return self.used_tokens + tokens <= self.available_tokens
+        return tokens <= self.remaining
 
     def add(self, tokens: Union[int, str]) -> bool:
         """
         Add tokens to the budget tracker.
 
+        Prefer add_tokens or add_text in loops, where the type is already known.
+
         Args:
             tokens: Either number of tokens (int) or text to count (str)
 
@@ -173,50 +453,164 @@ class TokenBudgetManager:
             True if added successfully, False if would exceed budget
         """
         if isinstance(tokens, str):
-            token_count = count_tokens(tokens, self.model_name)
-        else:
-            token_count = tokens
+            return self.add_text(tokens)
+        return self.add_tokens(tokens)
+
+    def add_tokens(self, token_count: int) -> bool:
+        """
+        Add a known number of tokens to the budget tracker.
+
+        Args:
+            token_count: Number of tokens, e.g. a precomputed doc['tokens']
 
-        if self.used_tokens + token_count <= self.available_tokens:
+        Returns:
+            True if added successfully, False if would exceed budget
+        """
+        if token_count <= self.remaining:
             self.used_tokens += token_count
+            self.remaining -= token_count
             return True
         return False
 
-    def reset(self):
+    def add_text(self, text: str) -> bool:
+        """
+        Count a text's tokens and add them to the budget tracker.
+
+        Args:
+            text: Text to count
+
+        Returns:
+            True if added successfully, False if would exceed budget
+        """
+        return self.add_tokens(count_tokens(text, self.model_name, tokenizer=self._tokenizer))
+
+    def add_many(self, counts: Union[List[int], np.ndarray]) -> np.ndarray:
+        """
+        Add items greedily, in order, the same as calling add() on each.
+
+        Items that don't fit are skipped and later, smaller ones may still be
+        added. The loop is compiled with Numba when it is installed.
+
+        Args:
+            counts: Token count of each item
+
+        Returns:
+            Boolean mask of the items that were added
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        taken, used = _greedy_fit_impl()(counts, self.used_tokens, self.available_tokens)
+        self.used_tokens = int(used)
+        self.remaining = self.available_tokens - self.used_tokens
+        return taken
+
+    def pack(self, counts: Union[List[int], np.ndarray]) -> np.ndarray:
+        """
+        Add the longest prefix of items that fits in the remaining budget.
+
+        Unlike add_many, packing stops at the first item that doesn't fit.
+        Reverse counts before and the mask after to pack from the end instead.
+
+        Args:
+            counts: Token count of each item, in the order to consider them
+
+        Returns:
+            Boolean mask of the items that were added (always a prefix)
+        """
+        cumulative = np.cumsum(np.asarray(counts, dtype=np.int64))
+        mask = cumulative <= self.remaining
+        if mask.any():
+            self.used_tokens += int(cumulative[mask][-1])
+            self.remaining = self.available_tokens - self.used_tokens
+        return mask
+
+    def reset(self) -> None:
         """Reset the budget tracker to zero usage."""
         self.used_tokens = 0
+        self.remaining = self.available_tokens
 
-    def __repr__(self):
+    def __repr__(self) -> str:
         return (f"TokenBudgetManager(max={self.max_tokens}, "
                 f"used={self.used_tokens}, "
                 f"remaining={self.remaining}, "
                 f"utilization={self.utilization:.1%})")
 
 
+def document_token_counts(documents: List[Dict]) -> np.ndarray:
+    """
+    Get the token count of every document as an array.
+
+    Documents without a 'tokens' field are counted in one batch and get the
+    field added, so each is only tokenized once.
+
+    Args:
+        documents: List of document dicts with 'content' or 'tokens' field
+
+    Returns:
+        Integer array of token counts, in document order
+    """
+    uncounted = [doc for doc in documents if 'tokens' not in doc]
+    if uncounted:
+        counts = count_tokens_batch([doc.get('content', '') for doc in uncounted])
+        for doc, count in zip(uncounted, counts):
+            doc['tokens'] = count
+
+    return np.fromiter((doc['tokens'] for doc in documents), dtype=np.int64, count=len(documents))
+
+
+def estimate_tokens_fast(text: str, kind: str = "text") -> int:
+    """
+    Approximate a token count from text length, without tokenizing.
+
+    Uses ~4 characters per token, scaled by how densely each kind of content
+    tokenizes. Good for rough sizing; use count_tokens where precision matters.
+
+    Args:
+        text: The text to estimate
+        kind: Content type: 'text', 'markdown', 'json' or 'code'
+
+    Returns:
+        Estimated number of tokens
+
+    Examples:
+        >>> estimate_tokens_fast("Context engineering is important.")
+        8
+    """
+    if kind not in _TOKEN_FACTORS:
+        raise ValueError(f"Unknown content kind: {kind}")
+
+    return math.ceil(len(text) / 4 * _TOKEN_FACTORS[kind])
+
+
 def estimate_tokens_for_documents(documents: List[Dict],
-                                  include_formatting: bool = True) -> int:
+                                  include_formatting: bool = True,
+                                  exact: bool = True) -> int:
     """
     Estimate total tokens needed for a list of documents.
 
+    With exact=True, documents without a 'tokens' field get one added, so
+    each is only tokenized once.
+
     Args:
         documents: List of document dicts with 'content' or 'tokens' field
         include_formatting: Whether to add overhead for separators and formatting
+        exact: Tokenize documents without a 'tokens' field. If False, estimate
+            them with estimate_tokens_fast (using doc['kind'], default 'text')
+            and leave the documents unchanged.
 
     Returns:
         Estimated total tokens
     """
-    total = 0
     formatting_overhead_per_doc = 10  # For separators, titles, etc.
 
-    for doc in documents:
-        # Use pre-calculated tokens if available, otherwise count
-        if 'tokens' in doc:
-            total += doc['tokens']
-        else:
-            total += count_tokens(doc.get('content', ''))
+    if exact:
+        total = int(document_token_counts(documents).sum())
+    else:
+        total = sum(doc['tokens'] if 'tokens' in doc
+                    else estimate_tokens_fast(doc.get('content', ''), doc.get('kind', 'text'))
+                    for doc in documents)
 
-        if include_formatting:
-            total += formatting_overhead_per_doc
+    if include_formatting:
+        total += formatting_overhead_per_doc * len(documents)
 
     return total
 
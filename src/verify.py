@@ -18,6 +18,7 @@ from pathlib import Path
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional
 import uuid
+import numpy as np
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -48,6 +49,10 @@ class LessonVerifier:
         self.checks_failed = []
         self.warnings = []
 
+        # One ID and timestamp per verification run, shared by whichever report is written
+        self._student_id = str(uuid.uuid4())
+        self._started_at = datetime.now().isoformat()
+
         print("=" * 80)
         print(" " * 25 + "CONTEXT ENGINEERING LESSON")
         print(" " * 28 + "AUTO-VERIFICATION")
@@ -118,8 +123,8 @@ class LessonVerifier:
         print("\n📋 Check 2: Token calculations accuracy")
 
         try:
-            # Load documents to verify token counts
-            documents = load_documents(self.data_dir / "source_documents.json")
+            # Load documents to verify the reported document count
+            actual_docs = len(load_documents(self.data_dir / "source_documents.json"))
 
             # Check if metadata contains token calculations
             metadata = results.get('metadata', {})
@@ -129,7 +134,6 @@ class LessonVerifier:
                 print("   ⚠️  WARNING: Token calculation metadata not found")
             else:
                 reported_docs = metadata['num_documents']
-                actual_docs = len(documents)
 
                 if reported_docs == actual_docs:
                     print(f"   ✅ PASS: Document count correct ({actual_docs})")
@@ -235,25 +239,36 @@ class LessonVerifier:
         print(f"   ✅ Found optimization: {', '.join(optimization_strategies)}")
 
         # Check if optimization shows improvement
-        baseline_accuracy = strategies_data.get('naive', {}).get('accuracy', 0)
+        baseline_data = strategies_data.get('naive', {})
+        baseline_accuracy = baseline_data.get('accuracy', 0)
+        baseline_tokens = baseline_data.get('avg_tokens', 1)
+
+        # Compare every optimization against the baseline in one pass
+        opt_names = list(optimization_strategies)
+        opt_accuracy = np.array([strategies_data[name].get('accuracy', 0) for name in opt_names], dtype=float)
+        opt_tokens = np.array([strategies_data[name].get('avg_tokens', 0) for name in opt_names], dtype=float)
 
-        improvement_found = False
-        for opt_name in optimization_strategies:
-            opt_data = strategies_data[opt_name]
-            opt_accuracy = opt_data.get('accuracy', 0)
-            opt_tokens = opt_data.get('avg_tokens', 0)
-            baseline_tokens = strategies_data.get('naive', {}).get('avg_tokens', 1)
+        if baseline_accuracy > 0:
+            accuracy_improvements = (opt_accuracy - baseline_accuracy) / baseline_accuracy
+        else:
+            accuracy_improvements = np.zeros_like(opt_accuracy)
+        if baseline_tokens > 0:
+            token_reductions = (baseline_tokens - opt_tokens) / baseline_tokens
+        else:
+            token_reductions = np.zeros_like(opt_tokens)
 
-            accuracy_improvement = (opt_accuracy - baseline_accuracy) / baseline_accuracy if baseline_accuracy > 0 else 0
-            token_reduction = (baseline_tokens - opt_tokens) / baseline_tokens if baseline_tokens > 0 else 0
+        # Need ≥10% accuracy improvement OR ≥20% token reduction, checked for all at once
+        meets_threshold = (accuracy_improvements >= 0.10) | (token_reductions >= 0.20)
+        improvement_found = bool(meets_threshold.any())
 
+        for opt_name, accuracy_improvement, token_reduction, passed in zip(
+                opt_names, accuracy_improvements, token_reductions, meets_threshold):
             print(f"\n   Strategy: {opt_name}")
             print(f"   - Accuracy improvement: {accuracy_improvement:+.1%}")
             print(f"   - Token reduction: {token_reduction:+.1%}")
 
-            if accuracy_improvement >= 0.10 or token_reduction >= 0.20:
+            if passed:
                 print(f"   ✅ Optimization meets threshold!")
-                improvement_found = True
             else:
                 print(f"   ⚠️  Below threshold (need ≥10% accuracy OR ≥20% token reduction)")
 
@@ -330,9 +345,9 @@ class LessonVerifier:
 
         # Build final report
         report = {
-            'student_id': str(uuid.uuid4()),
+            'student_id': self._student_id,
             'lesson': 'context_engineering',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': self._started_at,
             'completion_time_minutes': results.get('metadata', {}).get('completion_time_minutes', None),
 
             'verification': {
@@ -376,9 +391,8 @@ class LessonVerifier:
             'detailed_results': strategies_data
         }
 
-        # Save report
-        self.output_path.parent.mkdir(parents=True, exist_ok=True)
-        save_results(report, str(self.output_path))
+        # Save report (save_results creates progress/ and serializes with orjson when available)
+        save_results(report, self.output_path)
 
         return report
 
@@ -390,9 +404,9 @@ class LessonVerifier:
         print("=" * 80)
 
         report = {
-            'student_id': str(uuid.uuid4()),
+            'student_id': self._student_id,
             'lesson': 'context_engineering',
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': self._started_at,
             'verification': {
                 'grade': 'FAIL',
                 'error': error_message,